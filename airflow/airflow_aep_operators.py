@@ -1,13 +1,17 @@
-"""Custom Airflow operators that leverage :mod:`airflow_aep_hook`."""
+"""Custom Airflow operators that leverage :mod:`airflow_aep_hook`.
+
+The hook (and with it the AEP SDK probe) is imported inside ``execute`` so
+DAG files that instantiate these operators stay cheap to parse.
+"""
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from airflow.models import BaseOperator
-from airflow.utils.context import Context
 
-from airflow_aep_hook import AEPHook
+if TYPE_CHECKING:  # pragma: no cover
+    from airflow.utils.context import Context
 
 
 class AEPBatchIngestOperator(BaseOperator):
@@ -31,6 +35,8 @@ class AEPBatchIngestOperator(BaseOperator):
     def execute(self, context: Context) -> str:  # noqa: D401 - inherited docs
         import json
 
+        from airflow_aep_hook import AEPHook
+
         hook = AEPHook(aep_conn_id=self.aep_conn_id)
         ingest_client = hook.get_ingestion_client()
 
@@ -50,26 +56,75 @@ class AEPBatchIngestOperator(BaseOperator):
 
 
 class AEPQueryOperator(BaseOperator):
-    """Operator that runs a Query Service SQL query and returns rows."""
+    """Operator that runs a Query Service SQL query and returns rows.
+
+    Set ``partition_column`` together with ``partition_start`` and
+    ``partition_end`` to run the query as ``num_partitions`` time slices, at
+    most ``max_parallelism`` at a time, each retried up to ``slice_retries``
+    times; see :mod:`partitioned_query` for how the SQL is restricted.
+    """
 
-    template_fields: List[str] = ["sql"]
+    template_fields: List[str] = ["sql", "partition_start", "partition_end"]
 
     def __init__(
         self,
         *,
         sql: str,
         aep_conn_id: str = "aep_default",
+        partition_column: Optional[str] = None,
+        partition_start: Optional[str] = None,
+        partition_end: Optional[str] = None,
+        num_partitions: int = 8,
+        max_parallelism: int = 4,
+        slice_retries: int = 2,
         **kwargs: Any,
     ) -> None:
         super().__init__(**kwargs)
+        if partition_column and not (partition_start and partition_end):
+            raise ValueError("partition_start and partition_end are required with partition_column")
         self.sql = sql
         self.aep_conn_id = aep_conn_id
+        self.partition_column = partition_column
+        self.partition_start = partition_start
+        self.partition_end = partition_end
+        self.num_partitions = num_partitions
+        self.max_parallelism = max_parallelism
+        self.slice_retries = slice_retries
 
     def execute(self, context: Context) -> List[Dict[str, Any]]:  # noqa: D401 - inherited docs
+        from airflow_aep_hook import AEPHook
+
         hook = AEPHook(aep_conn_id=self.aep_conn_id)
         query_client = hook.get_query_client()
 
-        result = query_client.execute(self.sql)
-        rows = result.get("results", [])
-        self.log.info("Query returned %d rows", len(rows))
+        if not self.partition_column:
+            result = query_client.execute(self.sql)
+            rows = result.get("results", [])
+            self.log.info("Query returned %d rows", len(rows))
+            return rows
+
+        from partitioned_query import parse_timestamp, run_partitioned, time_slices
+
+        # Slices that collapse to nothing are dropped, so there may be fewer
+        # than num_partitions.
+        slice_count = len(
+            time_slices(
+                parse_timestamp(self.partition_start),
+                parse_timestamp(self.partition_end),
+                self.num_partitions,
+            )
+        )
+        rows = list(
+            run_partitioned(
+                lambda sql: query_client.execute(sql).get("results", []),
+                self.sql,
+                column=self.partition_column,
+                start=self.partition_start,
+                end=self.partition_end,
+                slices=self.num_partitions,
+                parallelism=self.max_parallelism,
+                retries=self.slice_retries,
+            )
+        )
+        self.log.info("Partitioned query returned %d rows in %d slices", len(rows), slice_count)
         return rows
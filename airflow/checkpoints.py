@@ -0,0 +1,256 @@
+"""Checkpoint storage for incremental ingestion of S3 objects.
+
+A checkpoint records the ETag and size of the last processed version of a
+source object together with the highest event timestamp ingested from it.
+Unchanged objects can then be skipped outright, and appended objects only
+contribute the records from the watermark on.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CHECKPOINT_DB = ".aep_checkpoints.sqlite"
+DEFAULT_CHECKPOINT_PREFIX = "aep-checkpoints"
+DEFAULT_TIMESTAMP_FIELD = "event_timestamp"
+
+
+@dataclass
+class Checkpoint:
+    """Last processed state of a single source object."""
+
+    source: str
+    etag: Optional[str] = None
+    size: Optional[int] = None
+    watermark: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    def matches(self, etag: Optional[str], size: Optional[int]) -> bool:
+        """Return ``True`` when ``etag``/``size`` describe the checkpointed version."""
+
+        if not etag or not self.etag:
+            return False
+        return self.etag == etag and (size is None or self.size is None or self.size == size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Checkpoint":
+        return cls(**data)
+
+
+class CheckpointStore:
+    """Interface for checkpoint backends; subclass to persist elsewhere."""
+
+    def get(self, source: str) -> Optional[Checkpoint]:  # pragma: no cover - interface
+        raise NotImplementedError
+
+    def put(self, checkpoint: Checkpoint) -> None:  # pragma: no cover - interface
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any connection held by the store."""
+
+
+class InMemoryCheckpointStore(CheckpointStore):
+    """Process-local store, useful for tests and one-off runs."""
+
+    def __init__(self) -> None:
+        self._checkpoints: Dict[str, Checkpoint] = {}
+
+    def get(self, source: str) -> Optional[Checkpoint]:
+        return self._checkpoints.get(source)
+
+    def put(self, checkpoint: Checkpoint) -> None:
+        self._checkpoints[checkpoint.source] = checkpoint
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Checkpoint store backed by a local SQLite file."""
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_DB) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    source TEXT PRIMARY KEY,
+                    etag TEXT,
+                    size INTEGER,
+                    watermark TEXT,
+                    updated_at TEXT
+                )
+                """
+            )
+
+    def get(self, source: str) -> Optional[Checkpoint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, etag, size, watermark, updated_at FROM checkpoints WHERE source = ?",
+                (source,),
+            ).fetchone()
+        return Checkpoint(*row) if row else None
+
+    def put(self, checkpoint: Checkpoint) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO checkpoints (source, etag, size, watermark, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    etag = excluded.etag,
+                    size = excluded.size,
+                    watermark = excluded.watermark,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    checkpoint.source,
+                    checkpoint.etag,
+                    checkpoint.size,
+                    checkpoint.watermark,
+                    checkpoint.updated_at,
+                ),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class S3CheckpointStore(CheckpointStore):
+    """Checkpoint store keeping one JSON object per source under an S3 prefix.
+
+    Unlike the SQLite store it is shared by every machine that can reach the
+    bucket, so tasks that read and write a checkpoint may run on different
+    workers.
+    """
+
+    def __init__(self, client: Any, bucket: str, prefix: str = DEFAULT_CHECKPOINT_PREFIX) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def key(self, source: str) -> str:
+        return f"{self.prefix}/{source.split('://', 1)[-1]}.checkpoint.json"
+
+    def get(self, source: str) -> Optional[Checkpoint]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(source))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return Checkpoint.from_dict(json.loads(response["Body"].read()))
+
+    def put(self, checkpoint: Checkpoint) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key(checkpoint.source),
+            Body=json.dumps(checkpoint.to_dict()).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+
+def default_checkpoint_store() -> CheckpointStore:
+    """Return the SQLite store configured via ``AEP_CHECKPOINT_DB``."""
+
+    return SQLiteCheckpointStore(os.getenv("AEP_CHECKPOINT_DB", DEFAULT_CHECKPOINT_DB))
+
+
+def source_uri(bucket: str, key: str) -> str:
+    return f"s3://{bucket}/{key}"
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class WatermarkFilter:
+    """Streaming form of :func:`filter_past_watermark`.
+
+    Call it on an iterable of records to get an iterator of the kept ones;
+    :attr:`watermark` holds the advanced watermark once that is exhausted.
+    """
+
+    def __init__(
+        self,
+        watermark: Optional[str],
+        timestamp_field: str = DEFAULT_TIMESTAMP_FIELD,
+        lookback: float = 0.0,
+        keep_ties: bool = True,
+    ) -> None:
+        self.watermark = watermark
+        self.timestamp_field = timestamp_field
+        self.keep_ties = keep_ties
+        self._latest = _parse_timestamp(watermark)
+        self._cutoff = self._latest - timedelta(seconds=lookback) if self._latest is not None else None
+
+    def __call__(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for record in records:
+            stamp = _parse_timestamp(record.get(self.timestamp_field))
+            if stamp is None:
+                yield record
+                continue
+            if self._cutoff is not None and (
+                stamp < self._cutoff or (stamp == self._cutoff and not self.keep_ties)
+            ):
+                continue
+            if self._latest is None or stamp > self._latest:
+                self._latest = stamp
+                self.watermark = str(record[self.timestamp_field])
+            yield record
+
+
+def filter_past_watermark(
+    records: Iterable[Dict[str, Any]],
+    watermark: Optional[str],
+    timestamp_field: str = DEFAULT_TIMESTAMP_FIELD,
+    lookback: float = 0.0,
+    keep_ties: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Drop records before ``watermark`` and return the advanced watermark.
+
+    Records stamped exactly at the watermark are kept, since more events can
+    share that timestamp, and so are records up to ``lookback`` seconds before
+    it, to pick up late arrivals; deduplication drops the ones already
+    ingested. Callers that do not deduplicate pass ``keep_ties=False`` (and no
+    ``lookback``) to drop everything at or before the watermark instead.
+    Records without a parseable timestamp (e.g. profile rows) cannot be
+    ordered and are always kept.
+    """
+
+    watermark_filter = WatermarkFilter(watermark, timestamp_field, lookback, keep_ties)
+    kept = list(watermark_filter(records))
+    return kept, watermark_filter.watermark
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+__all__ = [
+    "Checkpoint",
+    "CheckpointStore",
+    "InMemoryCheckpointStore",
+    "S3CheckpointStore",
+    "SQLiteCheckpointStore",
+    "WatermarkFilter",
+    "default_checkpoint_store",
+    "filter_past_watermark",
+    "source_uri",
+    "utc_now",
+]
@@ -1,15 +1,37 @@
-"""Example Airflow DAG that ingests cleaned records into AEP."""
+"""Example Airflow DAG that ingests cleaned records into AEP.
+
+The DAG processor re-imports this module on every parse loop, so module level
+code only declares the graph. S3/AEP hooks, the AEP SDK and the checkpoint
+store (kept in S3, since tasks may run on different workers) are imported
+inside the tasks that use them; see ``tests/test_dag_parse.py`` for the
+parse-time budget.
+"""
 
 from __future__ import annotations
 
-import json
+from datetime import datetime
+
 from airflow import DAG
 from airflow.decorators import task
-from airflow.providers.amazon.aws.hooks.s3 import S3Hook
-from airflow.utils.dates import days_ago
 
 from airflow_aep_operators import AEPBatchIngestOperator, AEPQueryOperator
 
+SOURCE_BUCKET = "your-bucket"
+SOURCE_KEY = "input/data.json"
+DATASET_ID = "YOUR_AEP_DATASET_ID"
+# Checkpoints live in S3 so that tasks running on different workers share them.
+CHECKPOINT_BUCKET = SOURCE_BUCKET
+CHECKPOINT_PREFIX = "aep-checkpoints"
+
+
+def _checkpoint_store():
+    from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+
+    from checkpoints import S3CheckpointStore
+
+    client = S3Hook(aws_conn_id="aws_default").get_conn()
+    return S3CheckpointStore(client, CHECKPOINT_BUCKET, CHECKPOINT_PREFIX)
+
 
 def _default_sql(dataset_id: str) -> str:
     return f"SELECT * FROM {dataset_id} LIMIT 100"
@@ -21,34 +43,80 @@ default_args = {
 
 with DAG(
     dag_id="aep_clean_ingest",
-    start_date=days_ago(1),
+    start_date=datetime(2024, 1, 1),
     schedule_interval="@daily",
     catchup=False,
     default_args=default_args,
     tags=["aep", "clean"],
 ) as dag:
 
-    @task
-    def load_records_from_s3() -> list:
+    @task(multiple_outputs=True)
+    def load_records_from_s3() -> dict:
+        """Load records added since the last checkpoint; skip if the object is unchanged."""
+
+        import json
+
+        from airflow.exceptions import AirflowSkipException
+        from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+
+        from checkpoints import Checkpoint, filter_past_watermark, source_uri
+
         s3 = S3Hook(aws_conn_id="aws_default")
-        bucket = "your-bucket"
-        key = "input/data.json"
+        source = source_uri(SOURCE_BUCKET, SOURCE_KEY)
+        store = _checkpoint_store()
+        try:
+            checkpoint = store.get(source)
+        finally:
+            store.close()
 
-        path = s3.download_file(bucket_name=bucket, key=key)
+        obj = s3.get_key(key=SOURCE_KEY, bucket_name=SOURCE_BUCKET)
+        if checkpoint is not None and checkpoint.matches(obj.e_tag, obj.content_length):
+            raise AirflowSkipException(f"{source} unchanged since last checkpoint")
+
+        path = s3.download_file(bucket_name=SOURCE_BUCKET, key=SOURCE_KEY)
         with open(path, "r", encoding="utf-8") as handle:
-            return json.load(handle)
+            records = json.load(handle)
+
+        # Nothing downstream deduplicates, so records at the watermark were
+        # already ingested by the previous run.
+        records, watermark = filter_past_watermark(
+            records, checkpoint.watermark if checkpoint else None, keep_ties=False
+        )
+        pending = Checkpoint(
+            source=source,
+            etag=obj.e_tag,
+            size=obj.content_length,
+            watermark=watermark,
+        )
+        return {"records": records, "checkpoint": pending.to_dict()}
+
+    @task
+    def save_checkpoint(pending: dict) -> None:
+        """Persist the checkpoint once the delta has been committed to AEP."""
+
+        from checkpoints import Checkpoint, utc_now
+
+        checkpoint = Checkpoint.from_dict(pending)
+        checkpoint.updated_at = utc_now()
+        store = _checkpoint_store()
+        try:
+            store.put(checkpoint)
+        finally:
+            store.close()
 
-    records = load_records_from_s3()
+    loaded = load_records_from_s3()
+    records = loaded["records"]
 
     ingest = AEPBatchIngestOperator(
         task_id="ingest_to_aep",
-        dataset_id="YOUR_AEP_DATASET_ID",
+        dataset_id=DATASET_ID,
         records=records,
     )
 
     query = AEPQueryOperator(
         task_id="query_aep",
-        sql=_default_sql("YOUR_AEP_DATASET_ID"),
+        sql=_default_sql(DATASET_ID),
     )
 
     records >> ingest >> query
+    ingest >> save_checkpoint(loaded["checkpoint"])
@@ -0,0 +1,262 @@
+"""Cross-run record deduplication backed by a disk-resident Bloom filter.
+
+Every record key is hashed, together with a namespace (the target dataset in
+the pipeline, so one index can serve several datasets), to a 16-byte digest.
+The Bloom filter answers
+"definitely new" for the vast majority of keys without touching the exact
+index; only Bloom positives are confirmed against a SQLite table of digests,
+so false positives never drop a record. Both structures live on disk, which
+keeps memory flat even for hundreds of millions of keys (~1.2 bytes/key in
+the filter at a 1% error rate).
+
+Keys first seen in the current run are staged in an on-disk temporary table
+rather than in memory; :meth:`RecordDeduplicator.commit_pending` copies them
+into the index once the run's upload has been committed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import struct
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+DEFAULT_DEDUP_DIR = ".aep_dedup"
+DEFAULT_CAPACITY = 200_000_000
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_KEY_FIELD = "_id"
+
+RecordKey = Union[str, Callable[[Dict[str, Any]], Any]]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter stored in a memory-mapped file."""
+
+    MAGIC = b"AEPBLOOM"
+    HEADER = struct.Struct("<8sQI")
+
+    def __init__(self, path: Union[str, Path], capacity: int, error_rate: float) -> None:
+        self.path = Path(path)
+        num_bits, num_hashes = self.optimal_parameters(capacity, error_rate)
+        size = self.HEADER.size + (num_bits + 7) // 8
+
+        if self.path.exists():
+            with open(self.path, "rb") as handle:
+                magic, num_bits, num_hashes = self.HEADER.unpack(handle.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise ValueError(f"{self.path} is not a Bloom filter file")
+            size = self.HEADER.size + (num_bits + 7) // 8
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "wb") as handle:
+                handle.write(self.HEADER.pack(self.MAGIC, num_bits, num_hashes))
+                # Sparse on most filesystems: untouched pages cost no disk.
+                handle.truncate(size)
+
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    @staticmethod
+    def optimal_parameters(capacity: int, error_rate: float) -> Tuple[int, int]:
+        """Return ``(bits, hashes)`` for ``capacity`` keys at ``error_rate``."""
+
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return num_bits, num_hashes
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        # Kirsch–Mitzenmacher double hashing over the two halves of the digest.
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        for index in range(self.num_hashes):
+            yield (first + index * second) % self.num_bits
+
+    def __contains__(self, digest: bytes) -> bool:
+        offset = self.HEADER.size
+        for bit in self._positions(digest):
+            if not self._map[offset + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def add(self, digest: bytes) -> None:
+        offset = self.HEADER.size
+        for bit in self._positions(digest):
+            position = offset + (bit >> 3)
+            self._map[position] |= 1 << (bit & 7)
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+@dataclass
+class DedupStats:
+    """Counters reported back in the pipeline result."""
+
+    checked: int = 0
+    unique: int = 0
+    duplicates: int = 0
+    unkeyed: int = 0
+    bloom_negatives: int = 0
+    bloom_positives: int = 0
+    false_positives: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+    def merge(self, other: "DedupStats") -> None:
+        """Add ``other``'s counters to this one (for chunked runs)."""
+
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+class RecordDeduplicator:
+    """Drop records whose key was already ingested in a previous run."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = DEFAULT_DEDUP_DIR,
+        *,
+        key: RecordKey = DEFAULT_KEY_FIELD,
+        capacity: int = DEFAULT_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.key = key
+        self.bloom = BloomFilter(self.directory / "keys.bloom", capacity, error_rate)
+        # Callers may hand the deduplicator to a worker thread; they must not
+        # use it from two threads at once.
+        self._conn = sqlite3.connect(str(self.directory / "keys.sqlite"), check_same_thread=False)
+        # Staged keys can outgrow memory on large runs; keep temp tables on disk.
+        self._conn.execute("PRAGMA temp_store = FILE")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS pending (digest BLOB PRIMARY KEY) WITHOUT ROWID"
+            )
+
+    def key_digest(self, record: Dict[str, Any], namespace: str = "") -> Optional[bytes]:
+        """Return the 16-byte digest of the record key in ``namespace``, or ``None`` if it has none."""
+
+        value = self.key(record) if callable(self.key) else record.get(self.key)
+        if value is None or value == "":
+            return None
+        key = f"{namespace}\0{value}" if namespace else str(value)
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def _seen_exact(self, digest: bytes) -> bool:
+        row = self._conn.execute("SELECT 1 FROM seen WHERE digest = ?", (digest,)).fetchone()
+        return row is not None
+
+    def filter(
+        self, records: Iterable[Dict[str, Any]], *, namespace: str = ""
+    ) -> Tuple[List[Dict[str, Any]], DedupStats]:
+        """Return the records whose key was not seen before, and counters.
+
+        Keys of the returned records are staged on disk, not recorded: call
+        :meth:`commit_pending` once they are ingested, or
+        :meth:`discard_pending` if the upload failed, so that a failed run does
+        not cause the records to be dropped on the next one. Staged keys also
+        drop repeats within a run, across any number of calls. Records without
+        a key are passed through unchanged. Keys only match keys seen in the
+        same ``namespace``.
+        """
+
+        stats = DedupStats()
+        unique: List[Dict[str, Any]] = []
+
+        with self._conn:
+            for record in records:
+                stats.checked += 1
+                digest = self.key_digest(record, namespace)
+                if digest is None:
+                    stats.unkeyed += 1
+                    unique.append(record)
+                    continue
+
+                if digest in self.bloom:
+                    stats.bloom_positives += 1
+                    if self._seen_exact(digest):
+                        stats.duplicates += 1
+                        continue
+                    stats.false_positives += 1
+                else:
+                    stats.bloom_negatives += 1
+
+                staged = self._conn.execute("INSERT OR IGNORE INTO pending (digest) VALUES (?)", (digest,))
+                if not staged.rowcount:
+                    # Repeat of a key staged earlier in this run.
+                    stats.duplicates += 1
+                    continue
+                unique.append(record)
+
+        stats.unique = len(unique)
+        return unique, stats
+
+    def commit_pending(self) -> None:
+        """Record every staged key as ingested, in the exact index and the Bloom filter."""
+
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO seen (digest) SELECT digest FROM pending")
+            for (digest,) in self._conn.execute("SELECT digest FROM pending"):
+                self.bloom.add(digest)
+            self._conn.execute("DELETE FROM pending")
+        self.bloom.flush()
+
+    def discard_pending(self) -> None:
+        """Forget keys staged by :meth:`filter` without recording them."""
+
+        with self._conn:
+            self._conn.execute("DELETE FROM pending")
+
+    def mark_seen(self, digests: Iterable[bytes]) -> None:
+        """Record ``digests`` as ingested in both the Bloom filter and exact index."""
+
+        digests = list(digests)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen (digest) VALUES (?)",
+                ((digest,) for digest in digests),
+            )
+        for digest in digests:
+            self.bloom.add(digest)
+        self.bloom.flush()
+
+    def close(self) -> None:
+        self.bloom.close()
+        self._conn.close()
+
+
+def default_deduplicator() -> RecordDeduplicator:
+    """Return the deduplicator configured via ``AEP_DEDUP_*`` environment variables."""
+
+    return RecordDeduplicator(
+        os.getenv("AEP_DEDUP_DIR", DEFAULT_DEDUP_DIR),
+        key=os.getenv("AEP_DEDUP_KEY", DEFAULT_KEY_FIELD),
+        capacity=int(os.getenv("AEP_DEDUP_CAPACITY", DEFAULT_CAPACITY)),
+        error_rate=float(os.getenv("AEP_DEDUP_ERROR_RATE", DEFAULT_ERROR_RATE)),
+    )
+
+
+__all__ = [
+    "BloomFilter",
+    "DedupStats",
+    "RecordDeduplicator",
+    "default_deduplicator",
+]
@@ -0,0 +1,190 @@
+"""Memory-bounded buffer of validated records that spills to disk.
+
+Records are kept as encoded NDJSON lines rather than dicts. Once the lines
+held in memory exceed ``memory_budget`` bytes they are appended to a temp
+file (gzip-compressed by default) and memory is released. Reading back
+yields the spilled lines first and then the in-memory tail, either as
+records or as NDJSON upload chunks of bounded size, so a large daily extract
+never has to be materialized as one list or one payload. The buffer is
+filled first and read afterwards; it cannot be appended to once read.
+
+Lines are encoded exactly like :meth:`models.AEPIngestPayload.to_ndjson`.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+DEFAULT_UPLOAD_CHUNK_BYTES = 256 * 1024 * 1024
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, if the platform reports it."""
+
+    try:
+        import resource
+        import sys
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class BufferStats:
+    """Counters reported back in the pipeline result."""
+
+    records: int = 0
+    bytes: int = 0
+    spilled_records: int = 0
+    spilled_bytes: int = 0
+    spill_file_bytes: int = 0
+    peak_buffer_bytes: int = 0
+    peak_rss_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RecordBuffer:
+    """Append-only record buffer with a memory budget; see the module docstring."""
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        *,
+        directory: Optional[str] = None,
+        compress: bool = True,
+    ) -> None:
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.compress = compress
+        self.stats = BufferStats()
+        self._lines: List[bytes] = []
+        self._memory_bytes = 0
+        self._spill_raw: Optional[IO[bytes]] = None
+        self._spill: Optional[IO[bytes]] = None
+        self._sealed = False
+
+    def __len__(self) -> int:
+        return self.stats.records
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._sealed:
+            raise RuntimeError("RecordBuffer cannot be appended to after it was read")
+        line = json.dumps(record).encode("utf-8")
+        self._lines.append(line)
+        self._memory_bytes += len(line) + 1
+        self.stats.records += 1
+        self.stats.bytes += len(line) + 1
+        self.stats.peak_buffer_bytes = max(self.stats.peak_buffer_bytes, self._memory_bytes)
+        if self._memory_bytes > self.memory_budget:
+            self._spill_lines()
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.append(record)
+
+    def _spill_lines(self) -> None:
+        if self._spill is None:
+            self._spill_raw = tempfile.TemporaryFile(dir=self.directory, prefix="aep-records-")
+            self._spill = (
+                gzip.GzipFile(fileobj=self._spill_raw, mode="wb", compresslevel=1)  # type: ignore[assignment]
+                if self.compress
+                else self._spill_raw
+            )
+        assert self._spill is not None
+        for line in self._lines:
+            self._spill.write(line)
+            self._spill.write(b"\n")
+        self.stats.spilled_records += len(self._lines)
+        self.stats.spilled_bytes += self._memory_bytes
+        self._lines = []
+        self._memory_bytes = 0
+
+    def _finish_spill(self) -> None:
+        self._sealed = True
+        if self._spill is None or self._spill_raw is None:
+            return
+        if self._spill is not self._spill_raw:
+            self._spill.close()  # writes the gzip trailer; leaves the raw file open
+        self._spill_raw.flush()
+        self.stats.spill_file_bytes = os.fstat(self._spill_raw.fileno()).st_size
+        self._spill = None
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Yield every encoded record (without newline), spilled ones first."""
+
+        self._finish_spill()
+        if self._spill_raw is not None:
+            self._spill_raw.seek(0)
+            reader = gzip.GzipFile(fileobj=self._spill_raw, mode="rb") if self.compress else self._spill_raw
+            for line in reader:
+                yield line.rstrip(b"\n")
+        yield from self._lines
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for line in self.iter_lines():
+            yield json.loads(line)
+
+    def iter_ndjson(self, max_bytes: int = DEFAULT_UPLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+        """Yield NDJSON payloads of at most ``max_bytes`` (or one record, if larger)."""
+
+        chunk: List[bytes] = []
+        size = 0
+        for line in self.iter_lines():
+            if chunk and size + len(line) + 1 > max_bytes:
+                yield b"\n".join(chunk)
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line) + 1
+        if chunk:
+            yield b"\n".join(chunk)
+
+    def report(self) -> Dict[str, Any]:
+        """Buffer counters plus the process peak RSS, for the pipeline result."""
+
+        self.stats.peak_rss_bytes = peak_rss_bytes()
+        return self.stats.to_dict()
+
+    def close(self) -> None:
+        """Delete the spill file (if any) and drop buffered records."""
+
+        if self._spill is not None and self._spill is not self._spill_raw:
+            self._spill.close()
+        if self._spill_raw is not None:
+            self._spill_raw.close()
+        self._spill = self._spill_raw = None
+        self._lines = []
+        self._memory_bytes = 0
+
+    def __enter__(self) -> "RecordBuffer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def default_record_buffer() -> RecordBuffer:
+    """Return a buffer configured via ``AEP_BUFFER_*`` environment variables."""
+
+    return RecordBuffer(
+        int(float(os.getenv("AEP_BUFFER_MEMORY_MB", DEFAULT_MEMORY_BUDGET / (1024 * 1024))) * 1024 * 1024),
+        directory=os.getenv("AEP_BUFFER_DIR") or None,
+        compress=os.getenv("AEP_BUFFER_COMPRESS", "1") not in ("0", "false", "False"),
+    )
+
+
+__all__ = [
+    "BufferStats",
+    "RecordBuffer",
+    "default_record_buffer",
+    "peak_rss_bytes",
+]
@@ -0,0 +1,69 @@
+"""Compile report CSVs into the columnar binary format served via mmap.
+
+Run with ``python compile_reports.py [report_id ...]`` from the ``api``
+directory (the Docker image does this at build time). Each report is written
+to ``data/compiled/<report_id>.birpt`` (or ``REPORT_COMPILED_DIR``) together
+with the CSV's mtime/size, so a CSV edited after compiling is detected as
+stale and parsed directly instead.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List
+
+API_DIR = str(Path(__file__).resolve().parent)
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+from routers.bi_query import (  # noqa: E402
+    COMPILED_DIR,
+    COMPILED_SUFFIX,
+    CSV_FILE_MAP,
+    read_csv_report,
+    resolve_csv_path,
+)
+from services.report_cache import file_version  # noqa: E402
+
+
+def compile_report(report_id: str, output_dir: Path = COMPILED_DIR) -> Path:
+    """Compile one report and return the path of the written file."""
+
+    csv_path = resolve_csv_path(report_id)
+    source_version = file_version(csv_path)
+    report = read_csv_report(report_id)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{report_id}{COMPILED_SUFFIX}"
+    tmp_path = output_path.with_suffix(".tmp")
+    tmp_path.write_bytes(
+        report.encode(
+            extra={
+                "source": csv_path.name,
+                "source_version": list(source_version),
+                "compiled_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+    )
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def main(argv: Iterable[str] = ()) -> List[Path]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("reports", nargs="*", help="Report ids to compile (default: all)")
+    parser.add_argument("--output-dir", type=Path, default=COMPILED_DIR)
+    args = parser.parse_args(list(argv))
+
+    written = []
+    for report_id in args.reports or CSV_FILE_MAP:
+        output_path = compile_report(report_id, args.output_dir)
+        print(f"Compiled {report_id} -> {output_path} ({output_path.stat().st_size} bytes)")
+        written.append(output_path)
+    return written
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,14 +1,40 @@
 """
 Main FastAPI application entry point
 """
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import health, bi_metadata, bi_query
+from routers import health, bi_metadata, bi_query, metrics
+from services.profiling import ProfilingMiddleware
+from services.telemetry import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background loaders and cache warm-up on startup, stop them on shutdown."""
+
+    bi_metadata.METADATA_LOADER.start()
+    tasks = {"metadata": bi_metadata.warm_metadata}
+    for report_id in bi_query.CSV_FILE_MAP:
+        tasks[f"report:{report_id}"] = partial(bi_query.warm_report, report_id)
+    # Not awaited here so /health answers while warming; /ready reports progress.
+    warmup = asyncio.create_task(health.WARMUP.run(tasks))
+    try:
+        yield
+    finally:
+        warmup.cancel()
+        bi_metadata.METADATA_LOADER.stop()
+
 
 app = FastAPI(
     title="BI Web App API",
     description="Business Intelligence API for executive dashboards",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -21,8 +47,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record latency/size metrics and emit Server-Timing headers. Added last so it
+# wraps CORS and measures the full request.
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in profiling (signed X-Profile-Signature requests and/or random
+# sampling); a no-op unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set.
+# Outermost so the profile covers every middleware.
+app.add_middleware(
+    ProfilingMiddleware,
+    secret=os.getenv("PROFILE_SECRET"),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    directory=os.getenv("PROFILE_DIR", "/tmp/bi-profiles"),
+    max_files=int(os.getenv("PROFILE_MAX_FILES", "100")),
+)
+
 # Include routers
 app.include_router(health.router, tags=["health"])
+app.include_router(metrics.router, tags=["metrics"])
 app.include_router(bi_metadata.router, prefix="/bi", tags=["bi-metadata"])
 app.include_router(bi_query.router, prefix="/bi", tags=["bi-query"])
 
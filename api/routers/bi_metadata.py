@@ -1,12 +1,16 @@
 """BI Metadata router - returns available dashboards and reports."""
 
-from fastapi import APIRouter, HTTPException
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
 
 from models.bi import DashboardMetadata, DashboardMetadataListResponse
+from services.metadata_loader import MetadataLoader
 
 router = APIRouter()
 
-# Sample metadata - in production this would come from dbt artifacts or a database
+# Sample metadata - served until a dbt manifest (DBT_MANIFEST_PATH) is loaded
 DASHBOARDS_METADATA = [
     DashboardMetadata(
         id="exec-revenue",
@@ -32,29 +36,43 @@ DASHBOARDS_METADATA = [
 ]
 
 
+METADATA_LOADER = MetadataLoader(
+    os.getenv("DBT_MANIFEST_PATH"),
+    fallback=DASHBOARDS_METADATA,
+    poll_interval=float(os.getenv("DBT_MANIFEST_POLL_SECONDS", "30")),
+)
+
+
+def warm_metadata() -> Dict[str, Any]:
+    """Load the dbt manifest (if configured) ahead of traffic; used by startup warm-up."""
+
+    METADATA_LOADER.refresh()
+    snapshot = METADATA_LOADER.snapshot
+    return {"dashboards": len(snapshot.dashboards), "bytes": len(snapshot.list_body)}
+
+
 @router.get("/metadata", response_model=DashboardMetadataListResponse)
-async def get_dashboards_metadata() -> DashboardMetadataListResponse:
+async def get_dashboards_metadata(
+    group: Optional[str] = Query(
+        None, description="Only return dashboards visible to this access group"
+    ),
+) -> Response:
     """Returns metadata for all available dashboards."""
 
-    return DashboardMetadataListResponse(
-        dashboards=DASHBOARDS_METADATA,
-        count=len(DASHBOARDS_METADATA),
-    )
+    body = METADATA_LOADER.snapshot.list_response(group)
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/metadata/{dashboard_id}", response_model=DashboardMetadata)
-async def get_dashboard_metadata(dashboard_id: str) -> DashboardMetadata:
+async def get_dashboard_metadata(dashboard_id: str) -> Response:
     """Returns metadata for a specific dashboard."""
 
-    dashboard = next(
-        (d for d in DASHBOARDS_METADATA if d.id == dashboard_id),
-        None,
-    )
+    body = METADATA_LOADER.snapshot.item_bodies.get(dashboard_id)
 
-    if not dashboard:
+    if body is None:
         raise HTTPException(
             status_code=404,
             detail=f"Dashboard '{dashboard_id}' not found",
         )
 
-    return dashboard
+    return Response(content=body, media_type="application/json")
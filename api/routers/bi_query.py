@@ -1,13 +1,28 @@
 """BI Query router - reads CSV data files and returns JSON."""
 
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple, Union
 
 import csv
+import json
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 
 from models.bi import QueryData, QueryResponse
+from services.access import GROUPS_HEADER, load_access_policies, parse_groups, resolve_group
+from services.columnar import ColumnarReport, coerce_value, map_report_file
+from services.downsample import downsample
+from services.report_cache import CachePolicy, FileVersion, ReportCache, file_version
+from services.snapshots import SnapshotStore
+from services.tail_loader import TailLoader
+from services.telemetry import REPORT_CACHE_LOOKUPS, REPORT_RELOADS, server_timing, set_report
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -22,9 +37,49 @@ CSV_FILE_MAP = {
 # Get the data directory path
 DATA_DIR = Path(__file__).parent.parent / "data"
 
+# Precompiled columnar reports written by ``compile_reports.py``; mapped with
+# mmap instead of parsing the CSV when present and up to date.
+COMPILED_DIR = Path(os.getenv("REPORT_COMPILED_DIR", str(DATA_DIR / "compiled")))
+COMPILED_SUFFIX = ".birpt"
 
-def read_csv_data(report_id: str) -> QueryData:
-    """Read CSV file and return data as a :class:`QueryData` model."""
+# Parsed reports, revalidated against the source according to REPORT_POLICIES
+REPORT_CACHE = ReportCache()
+
+# Server-side stale-while-revalidate windows (seconds). Within ``ttl`` cached
+# data is served as-is; up to ``max_stale`` it is served while one background
+# refresh runs; beyond that the request revalidates synchronously. Override
+# per report with e.g. REPORT_CACHE_POLICIES='{"field-ops": {"ttl": 15, "max_stale": 60}}'.
+DEFAULT_CACHE_POLICY = CachePolicy(ttl=60, max_stale=600)
+REPORT_POLICIES = {
+    "field-ops": CachePolicy(ttl=30, max_stale=300),
+    "kpi-summary": CachePolicy(ttl=300, max_stale=3600),
+    "exec-revenue": CachePolicy(ttl=3600, max_stale=86400),
+    "customer-churn": CachePolicy(ttl=3600, max_stale=86400),
+}
+REPORT_POLICIES.update(
+    {
+        report_id: CachePolicy(**policy)
+        for report_id, policy in json.loads(os.getenv("REPORT_CACHE_POLICIES", "{}")).items()
+    }
+)
+
+# Row/column-level access per report and group; see services/access.py for the
+# format. Reports without a policy are served in full to everyone.
+ACCESS_POLICIES = load_access_policies(os.getenv("REPORT_ACCESS_POLICIES", "{}"))
+
+_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-refresh")
+
+# Remembers how far each CSV has been parsed so appended rows are parsed alone.
+TAIL_LOADER = TailLoader()
+
+# Optional cross-worker snapshots; set REPORT_SNAPSHOT_DIR when running several
+# uvicorn workers so each report is parsed once and shared via mmap.
+SNAPSHOT_DIR = os.getenv("REPORT_SNAPSHOT_DIR")
+SNAPSHOT_STORE = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+
+def resolve_csv_path(report_id: str) -> Path:
+    """Return the CSV path for ``report_id`` or raise a 404."""
 
     csv_filename = CSV_FILE_MAP.get(report_id)
     if not csv_filename:
@@ -39,35 +94,24 @@ def read_csv_data(report_id: str) -> QueryData:
             status_code=404,
             detail=f"CSV file not found: {csv_filename}",
         )
+    return csv_path
+
+
+def read_csv_report(report_id: str) -> ColumnarReport:
+    """Read a CSV file into a :class:`ColumnarReport`, converting numeric strings."""
+
+    csv_path = resolve_csv_path(report_id)
 
     try:
         with open(csv_path, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
-            rows = list(reader)
-            columns = reader.fieldnames if reader.fieldnames else []
-
-            # Convert numeric strings to appropriate types
-            processed_rows = []
-            for row in rows:
-                processed_row = {}
-                for key, value in row.items():
-                    if value is None:
-                        processed_row[key] = None
-                        continue
-
-                    try:
-                        processed_row[key] = float(value)
-                        if "." not in value:
-                            processed_row[key] = int(processed_row[key])
-                    except ValueError:
-                        processed_row[key] = value
-                processed_rows.append(processed_row)
-
-            return QueryData(
-                columns=columns,
-                rows=processed_rows,
-                count=len(processed_rows),
-            )
+            rows = [
+                {key: coerce_value(value) for key, value in row.items()}
+                for row in reader
+            ]
+            columns = list(reader.fieldnames) if reader.fieldnames else []
+
+            return ColumnarReport.from_rows(columns, rows)
     except HTTPException:
         raise
     except Exception as exc:  # pragma: no cover - defensive fallback
@@ -77,28 +121,235 @@ def read_csv_data(report_id: str) -> QueryData:
         ) from exc
 
 
+def read_csv_data(report_id: str) -> QueryData:
+    """Read CSV file and return data as a :class:`QueryData` model."""
+
+    return read_csv_report(report_id).to_query_data()
+
+
+def compiled_report_path(report_id: str) -> Path:
+    return COMPILED_DIR / f"{report_id}{COMPILED_SUFFIX}"
+
+
+def _source_versions(report_id: str) -> Tuple[Optional[FileVersion], Optional[FileVersion]]:
+    """Return ``(csv_version, compiled_version)``; either may be missing, not both."""
+
+    csv_filename = CSV_FILE_MAP.get(report_id)
+    if not csv_filename:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No CSV file mapped for report_id: {report_id}",
+        )
+
+    csv_path = DATA_DIR / csv_filename
+    compiled_path = compiled_report_path(report_id)
+    csv_version = file_version(csv_path) if csv_path.exists() else None
+    compiled_version = file_version(compiled_path) if compiled_path.exists() else None
+
+    if csv_version is None and compiled_version is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"CSV file not found: {csv_filename}",
+        )
+    return csv_version, compiled_version
+
+
+def load_compiled_report(
+    report_id: str, csv_version: Optional[FileVersion]
+) -> Optional[ColumnarReport]:
+    """Map the compiled report, or return ``None`` if the CSV changed since
+    compiling or the file cannot be decoded (corrupt or an older format)."""
+
+    try:
+        report, extra, _ = map_report_file(compiled_report_path(report_id))
+    except (ValueError, KeyError, TypeError, struct.error) as exc:
+        logger.warning("Compiled report for %s is unreadable (%s); reading the CSV instead", report_id, exc)
+        return None
+    source = extra.get("source_version")
+    if csv_version is not None and (source is None or tuple(source) != csv_version):
+        logger.warning("Compiled report for %s is stale; reading the CSV instead", report_id)
+        return None
+    return report
+
+
+def _parse_report(report_id: str) -> ColumnarReport:
+    csv_path = resolve_csv_path(report_id)
+    with server_timing("parse"):
+        try:
+            # With snapshots the parsed report is only encoded into the shared
+            # snapshot and then read back mapped, so no tail state is kept.
+            report, mode = TAIL_LOADER.load(csv_path, track=SNAPSHOT_STORE is None)
+        except Exception as exc:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error reading CSV: {exc}",
+            ) from exc
+    REPORT_RELOADS.inc(report_id, mode)
+    return report
+
+
+def revalidate_report(report_id: str) -> ColumnarReport:
+    """Check the report source and reload it if it changed since it was cached.
+
+    A compiled report is preferred (mapped, no parsing); otherwise the CSV is
+    parsed, through the shared snapshot store when one is configured.
+    """
+
+    with server_timing("cache"):
+        csv_version, compiled_version = _source_versions(report_id)
+        version = (csv_version, compiled_version)
+        cached = REPORT_CACHE.lookup(report_id, version)
+
+    if cached is not None:
+        REPORT_CACHE.mark_validated(report_id)
+        return cached
+
+    data: Optional[ColumnarReport] = None
+    if compiled_version is not None:
+        with server_timing("mmap"):
+            data = load_compiled_report(report_id, csv_version)
+
+    if data is None:
+        if SNAPSHOT_STORE is not None:
+            with server_timing("snapshot"):
+                data = SNAPSHOT_STORE.get_or_build(
+                    report_id, csv_version, lambda: _parse_report(report_id)
+                ).report
+        else:
+            data = _parse_report(report_id)
+
+    REPORT_CACHE.store(report_id, version, data)
+    return data
+
+
+def _background_refresh(report_id: str) -> None:
+    error: Optional[BaseException] = None
+    try:
+        revalidate_report(report_id)
+    except Exception as exc:  # keep serving the last good data
+        error = exc
+        logger.warning("Background refresh of %s failed: %s", report_id, exc)
+    finally:
+        REPORT_CACHE.end_refresh(report_id, error)
+
+
+def load_report_data(report_id: str) -> ColumnarReport:
+    """Return report data, applying the report's stale-while-revalidate policy.
+
+    Each call counts one cache lookup: ``hit`` within the TTL, ``stale`` when
+    served while a background refresh runs, ``miss`` when the caller has to
+    wait for :func:`revalidate_report`, which counts nothing itself.
+    """
+
+    policy = REPORT_POLICIES.get(report_id, DEFAULT_CACHE_POLICY)
+
+    with server_timing("cache"):
+        entry = REPORT_CACHE.entry(report_id)
+        age = entry.age() if entry is not None else None
+
+    if entry is not None and age is not None:
+        if age <= policy.ttl:
+            REPORT_CACHE_LOOKUPS.inc(report_id, "hit")
+            return entry.data
+        if age <= policy.max_stale:
+            REPORT_CACHE_LOOKUPS.inc(report_id, "stale")
+            if REPORT_CACHE.begin_refresh(report_id):
+                _REFRESH_EXECUTOR.submit(_background_refresh, report_id)
+            return entry.data
+
+    # Anything the cache cannot serve as is waits for a revalidation.
+    REPORT_CACHE_LOOKUPS.inc(report_id, "miss")
+    try:
+        return revalidate_report(report_id)
+    except Exception as exc:
+        if report_id in CSV_FILE_MAP:
+            REPORT_CACHE.record_failure(report_id, exc)
+        raise
+
+
+def warm_report(report_id: str) -> Dict[str, Any]:
+    """Load ``report_id`` into the cache ahead of traffic; used by startup warm-up."""
+
+    data = load_report_data(report_id)
+    return {"rows": data.num_rows, "bytes": len(data.data_json)}
+
+
+def render_query_response(report_id: str, data_json: Union[bytes, memoryview]) -> bytes:
+    """Assemble the ``QueryResponse`` JSON around pre-serialized report data."""
+
+    return b"".join(
+        (
+            b'{"report_id":',
+            json.dumps(report_id).encode("utf-8"),
+            b',"data":',
+            data_json,
+            b',"source":"csv","message":"Data loaded from CSV files"}',
+        )
+    )
+
+
 @router.get("/query", response_model=QueryResponse)
 async def query_data(
-    response: Response,
     report_id: str = Query(..., description="Report ID to query"),
     filters: Optional[str] = Query(
         None, description="Optional filters as JSON string"
     ),
-) -> QueryResponse:
+    max_points: Optional[int] = Query(
+        None,
+        ge=3,
+        description="Downsample time series to about this many rows (LTTB over the date column)",
+    ),
+    user_groups: Optional[str] = Header(
+        None, alias=GROUPS_HEADER, description="Caller's access groups, comma-separated"
+    ),
+) -> Response:
     """Read data from CSV files and return as JSON.
 
     In production, this will query AWS RDS databases.
     """
 
-    # Set cache-control headers with short TTL for real-time dashboards
-    # Adjust max-age as needed based on data freshness requirements
-    response.headers["Cache-Control"] = "public, max-age=60, stale-while-revalidate=120"
+    policies = ACCESS_POLICIES.get(report_id)
+    group: Optional[str] = None
+    if policies is not None:
+        group = resolve_group(policies, parse_groups(user_groups))
+        if group is None:
+            raise HTTPException(status_code=403, detail=f"Not permitted to view report: {report_id}")
+
+    # Loading can parse a CSV or wait on another worker's snapshot lock, so it
+    # runs in the threadpool rather than stalling the event loop.
+    base = await run_in_threadpool(load_report_data, report_id)
+    set_report(report_id)
+
+    # Views are derived from the cached base report, so each is computed once
+    # per report version and then served by lookup.
+    result = base
+    if group is not None:
+        with server_timing("access"):
+            result = REPORT_CACHE.derive(report_id, base, ("access", group), policies[group].compile)
+
+    if max_points is not None and result.num_rows > max_points:
+        view = result
+        with server_timing("downsample"):
+            result = REPORT_CACHE.derive(
+                report_id, base, ("max_points", max_points, group), lambda _: downsample(view, max_points)
+            )
 
-    result = read_csv_data(report_id)
+    # Serialize here rather than through ``response_model`` so the cost shows up
+    # as its own ``Server-Timing`` entry. The report's data JSON is built once
+    # per cached version (or read straight from a shared snapshot).
+    with server_timing("serialize"):
+        body = render_query_response(report_id, result.data_json)
 
-    return QueryResponse(
-        report_id=report_id,
-        data=result,
-        source="csv",
-        message="Data loaded from CSV files",
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={
+            # Short TTL for real-time dashboards; adjust max-age as needed based
+            # on data freshness requirements. Group-restricted views must not be
+            # stored by shared caches.
+            "Cache-Control": "{}, max-age=60, stale-while-revalidate=120".format(
+                "public" if policies is None else "private"
+            ),
+            **({"Vary": GROUPS_HEADER} if policies is not None else {}),
+        },
     )
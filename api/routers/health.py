@@ -2,18 +2,47 @@
 Health check router
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
 
+from routers.bi_query import REPORT_CACHE
+from services.warmup import WarmupTracker
+
 router = APIRouter()
 
+# Filled in by the application lifespan (see index.py)
+WARMUP = WarmupTracker()
+
 
 @router.get("/health")
 async def health_check():
     """
     Returns the health status of the API
+
+    Reports whose last refresh failed are listed under ``reports`` and turn the
+    status to ``degraded``; they keep serving their last good data.
     """
+    reports = REPORT_CACHE.status()
+    degraded = any(report["last_error"] for report in reports.values())
     return {
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "service": "BI Web App API"
+        "service": "BI Web App API",
+        "reports": reports,
     }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Returns 200 once startup warm-up has loaded every report and the dashboard
+    metadata, 503 before that; includes per-report timings and sizes
+    """
+    return JSONResponse(
+        status_code=200 if WARMUP.ready else 503,
+        content={
+            "status": "ready" if WARMUP.ready else "warming",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "warmup": WARMUP.status(),
+        },
+    )
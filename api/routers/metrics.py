@@ -0,0 +1,15 @@
+"""Prometheus metrics router."""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.telemetry import PROMETHEUS_CONTENT_TYPE, REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Expose request and cache metrics in the Prometheus text format."""
+
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,127 @@
+"""Row- and column-level access policies for reports, by access group.
+
+A report with a policy is only visible to the groups listed in it. Each group
+may be limited to a subset of columns (projection) and to rows whose values
+are in an allow-list (row mask)::
+
+    {
+      "exec-revenue": {
+        "C_SUITE": {},
+        "FINANCE": {"columns": ["month", "total_revenue", "mrr", "arr"]}
+      },
+      "kpi-summary": {
+        "C_SUITE": {},
+        "OPS": {"rows": {"metric": ["Routes Completed", "Avg Quality Score"]}}
+      }
+    }
+
+Groups are listed most privileged first; a caller in several groups gets the
+view of the first one that matches, so views are never merged. Reports
+without a policy are visible to everyone, unchanged.
+
+A group's view is compiled once per cached report version into row indexes
+plus a projection over the report's shared columns (see
+:meth:`ColumnarReport.select`); only its serialized JSON is built per group,
+so enforcing a policy per request is a dictionary lookup.
+
+The groups header is only trustworthy when the proxy in front of the API sets
+it; the bundled nginx configs clear any client-supplied value.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from models.bi import PrimitiveValue
+from services.columnar import ColumnarReport
+
+# Set by the authenticating proxy in front of the API, e.g. "C_SUITE, FINANCE".
+# The proxy must drop any value sent by the client.
+GROUPS_HEADER = "X-User-Groups"
+
+
+@dataclass(frozen=True)
+class GroupPolicy:
+    """What one access group may see of a report."""
+
+    columns: Optional[Tuple[str, ...]] = None
+    rows: Optional[Tuple[Tuple[str, FrozenSet[PrimitiveValue]], ...]] = None
+
+    @classmethod
+    def from_dict(cls, raw: Mapping[str, object]) -> "GroupPolicy":
+        columns = raw.get("columns")
+        rows = raw.get("rows")
+        return cls(
+            columns=tuple(columns) if columns is not None else None,  # type: ignore[arg-type]
+            rows=tuple(
+                (column, frozenset(values)) for column, values in rows.items()  # type: ignore[union-attr]
+            )
+            if rows is not None
+            else None,
+        )
+
+    def row_indexes(self, report: ColumnarReport) -> Optional[List[int]]:
+        """Indexes of rows passing every row filter (``None`` if unfiltered).
+
+        Unknown filter columns match nothing.
+        """
+
+        if not self.rows:
+            return None
+        allowed = [True] * report.num_rows
+        for column, values in self.rows:
+            if column not in report.data:
+                return []
+            for index, value in enumerate(report.column(column)):
+                if value not in values:
+                    allowed[index] = False
+        return [index for index, keep in enumerate(allowed) if keep]
+
+    def projection(self, report: ColumnarReport) -> List[str]:
+        if self.columns is None:
+            return list(report.columns)
+        return [column for column in report.columns if column in self.columns]
+
+    def compile(self, report: ColumnarReport) -> ColumnarReport:
+        """Return this group's view of ``report``, sharing its column data."""
+
+        return report.select(self.row_indexes(report), columns=self.projection(report))
+
+
+# report id -> {group: policy}, in priority order
+AccessPolicies = Dict[str, Dict[str, GroupPolicy]]
+
+
+def load_access_policies(raw: str) -> AccessPolicies:
+    """Parse the JSON policy document shown in the module docstring."""
+
+    return {
+        report_id: {group: GroupPolicy.from_dict(policy) for group, policy in groups.items()}
+        for report_id, groups in json.loads(raw or "{}").items()
+    }
+
+
+def parse_groups(header: Optional[str]) -> List[str]:
+    return [group.strip() for group in (header or "").split(",") if group.strip()]
+
+
+def resolve_group(policies: Mapping[str, GroupPolicy], groups: Iterable[str]) -> Optional[str]:
+    """Return the first policy group the caller belongs to, or ``None``."""
+
+    member_of = set(groups)
+    for group in policies:
+        if group in member_of:
+            return group
+    return None
+
+
+__all__ = [
+    "AccessPolicies",
+    "GROUPS_HEADER",
+    "GroupPolicy",
+    "load_access_policies",
+    "parse_groups",
+    "resolve_group",
+]
@@ -0,0 +1,379 @@
+"""Columnar representation of report data and its binary encoding.
+
+Reports are held column by column rather than as a list of row dicts:
+
+* ``number`` columns are float64 arrays plus a uint8 mask marking values that
+  were integers in the CSV (the CSV loader has always emitted ``int`` for
+  values without a decimal point).
+* ``string`` columns are a UTF-8 blob plus int64 end offsets.
+* ``mixed`` columns (numbers and text, or missing cells) store every cell as
+  JSON text in a ``string`` layout.
+
+The binary layout is a fixed magic, a JSON header and 8-byte aligned column
+blocks, so a report can be decoded straight from an ``mmap`` with
+``memoryview.cast`` and no copying.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from models.bi import PrimitiveValue, QueryData
+
+MAGIC = b"BIRPT001"
+_PREFIX = struct.Struct("<8sQ")  # magic, header length
+_ALIGN = 8
+
+
+def coerce_value(value: Optional[str]) -> PrimitiveValue:
+    """Convert a raw CSV cell the same way ``read_csv_data`` always has."""
+
+    if value is None:
+        return None
+    try:
+        number = float(value)
+        # int() is inside the try: "nan" parses as a float but not as an int.
+        return int(number) if "." not in value else number
+    except ValueError:
+        return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class NumberColumn(Sequence[Union[int, float]]):
+    """float64 values plus an is-integer mask; accepts arrays or memoryviews."""
+
+    kind = "number"
+
+    def __init__(self, values: Union[array, memoryview], int_mask: Union[array, memoryview]) -> None:
+        self.values = values
+        self.int_mask = int_mask
+
+    @classmethod
+    def from_values(cls, values: Sequence[Union[int, float]]) -> "NumberColumn":
+        return cls(
+            array("d", (float(v) for v in values)),
+            array("B", (isinstance(v, int) for v in values)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self.values[index]
+        return int(value) if self.int_mask[index] else value
+
+    def __iter__(self) -> Iterator[Union[int, float]]:
+        for value, is_int in zip(self.values, self.int_mask):
+            yield int(value) if is_int else value
+
+    def blocks(self) -> List[bytes]:
+        return [bytes(memoryview(self.values).cast("B")), bytes(memoryview(self.int_mask).cast("B"))]
+
+
+class StringColumn(Sequence[str]):
+    """UTF-8 blob with int64 end offsets; ``mixed`` columns store JSON text."""
+
+    def __init__(self, blob: Union[bytes, memoryview], ends: Union[array, memoryview], kind: str = "string") -> None:
+        self.blob = blob
+        self.ends = ends
+        self.kind = kind
+
+    @classmethod
+    def from_values(cls, values: Sequence[Any], kind: str = "string") -> "StringColumn":
+        encoded = [
+            (json.dumps(v) if kind == "mixed" else v).encode("utf-8") for v in values
+        ]
+        ends = array("q")
+        total = 0
+        for item in encoded:
+            total += len(item)
+            ends.append(total)
+        return cls(b"".join(encoded), ends, kind)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def _raw(self, index: int) -> str:
+        start = self.ends[index - 1] if index > 0 else 0
+        return bytes(self.blob[start:self.ends[index]]).decode("utf-8")
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        raw = self._raw(index)
+        return json.loads(raw) if self.kind == "mixed" else raw
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def blocks(self) -> List[bytes]:
+        return [bytes(memoryview(self.ends).cast("B")), bytes(self.blob)]
+
+
+class RowSelection(Sequence[Any]):
+    """The rows at ``indices`` of a shared column, without copying its data."""
+
+    def __init__(self, column: Union[NumberColumn, StringColumn], indices: array) -> None:
+        self.column = column
+        self.indices = indices
+        self.kind = column.kind
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.column[self.indices[index]]
+
+    def __iter__(self) -> Iterator[Any]:
+        column = self.column
+        for index in self.indices:
+            yield column[index]
+
+    def blocks(self) -> List[bytes]:
+        if self.kind == "number":
+            return NumberColumn.from_values(list(self)).blocks()
+        return StringColumn.from_values(list(self), self.kind).blocks()
+
+
+Column = Union[NumberColumn, StringColumn, RowSelection]
+
+
+def build_column(values: Sequence[PrimitiveValue]) -> Column:
+    """Pick the most compact column layout for already-coerced values."""
+
+    if values and all(_is_number(v) for v in values):
+        return NumberColumn.from_values(values)  # type: ignore[arg-type]
+    if all(isinstance(v, str) for v in values):
+        return StringColumn.from_values(values)
+    return StringColumn.from_values(values, kind="mixed")
+
+
+class ColumnarReport:
+    """Report data stored column-wise; see module docstring for the layout."""
+
+    def __init__(
+        self,
+        columns: List[str],
+        data: Dict[str, Column],
+        num_rows: int,
+        data_json: Optional[Union[bytes, memoryview]] = None,
+    ) -> None:
+        self.columns = columns
+        self.data = data
+        self.num_rows = num_rows
+        self._data_json = data_json
+
+    @classmethod
+    def from_rows(cls, columns: List[str], rows: List[Dict[str, PrimitiveValue]]) -> "ColumnarReport":
+        data = {name: build_column([row.get(name) for row in rows]) for name in columns}
+        return cls(columns, data, len(rows))
+
+    def column(self, name: str) -> Column:
+        return self.data[name]
+
+    def take(self, indices: Sequence[int], columns: Optional[List[str]] = None) -> "ColumnarReport":
+        """Return a new report with the rows at ``indices`` (in that order) and ``columns``."""
+
+        names = list(self.columns if columns is None else columns)
+        data = {name: build_column([self.data[name][i] for i in indices]) for name in names}
+        return ColumnarReport(names, data, len(indices))
+
+    def select(self, indices: Optional[Sequence[int]], columns: Optional[List[str]] = None) -> "ColumnarReport":
+        """Return a view of the rows at ``indices`` (all if ``None``) and ``columns``.
+
+        Unlike :meth:`take`, column data is shared with this report; the view
+        only holds the row indexes.
+        """
+
+        names = list(self.columns if columns is None else columns)
+        if indices is None:
+            return ColumnarReport(names, {name: self.data[name] for name in names}, self.num_rows)
+        rows = array("q", indices)
+        data: Dict[str, Column] = {}
+        for name in names:
+            column = self.data[name]
+            if isinstance(column, RowSelection):
+                data[name] = RowSelection(column.column, array("q", (column.indices[i] for i in rows)))
+            else:
+                data[name] = RowSelection(column, rows)
+        return ColumnarReport(names, data, len(rows))
+
+    def rows(self) -> List[Dict[str, PrimitiveValue]]:
+        """Materialize the report as row dicts (in column order)."""
+
+        names = self.columns
+        return [dict(zip(names, values)) for values in zip(*(self.data[n] for n in names))] if names else []
+
+    def append_rows(self, rows: List[Dict[str, PrimitiveValue]]) -> "ColumnarReport":
+        """Return a new report with ``rows`` appended; ``self`` is left untouched.
+
+        Existing column data is copied, not re-parsed. Columns whose layout no
+        longer fits the new values (e.g. text arriving in a number column) are
+        rebuilt. The serialized JSON, if already computed, is extended in place
+        of being regenerated.
+        """
+
+        if not rows:
+            return self
+        data: Dict[str, Column] = {}
+        for name in self.columns:
+            column = self.data[name]
+            values = [row.get(name) for row in rows]
+            if isinstance(column, NumberColumn) and all(_is_number(v) for v in values):
+                extra = NumberColumn.from_values(values)  # type: ignore[arg-type]
+                numbers, int_mask = array("d"), array("B")
+                numbers.frombytes(column.values.tobytes())
+                numbers.extend(extra.values)
+                int_mask.frombytes(column.int_mask.tobytes())
+                int_mask.extend(extra.int_mask)
+                data[name] = NumberColumn(numbers, int_mask)
+            elif isinstance(column, StringColumn) and (
+                column.kind == "mixed" or all(isinstance(v, str) for v in values)
+            ):
+                extra_strings = StringColumn.from_values(values, column.kind)
+                offset = column.ends[len(column) - 1] if len(column) else 0
+                ends = array("q")
+                ends.frombytes(column.ends.tobytes())
+                ends.extend(end + offset for end in extra_strings.ends)
+                data[name] = StringColumn(bytes(column.blob) + extra_strings.blob, ends, column.kind)
+            else:
+                data[name] = build_column(list(column) + values)
+
+        num_rows = self.num_rows + len(rows)
+        data_json = None
+        if self._data_json is not None:
+            current = bytes(self._data_json)
+            head = current[: current.rindex(b'],"count":')]
+            added = json.dumps(
+                [{name: row.get(name) for name in self.columns} for row in rows], separators=(",", ":")
+            ).encode("utf-8")[1:-1]
+            data_json = b"".join(
+                (head, b"," if self.num_rows else b"", added, b'],"count":', str(num_rows).encode("ascii"), b"}")
+            )
+        return ColumnarReport(list(self.columns), data, num_rows, data_json)
+
+    def to_query_data(self) -> QueryData:
+        return QueryData(columns=list(self.columns), rows=self.rows(), count=self.num_rows)
+
+    @property
+    def data_json(self) -> Union[bytes, memoryview]:
+        """Serialized ``QueryData`` JSON for the full report, computed once.
+
+        Decoded reports return a view into their buffer rather than a copy.
+        """
+
+        if self._data_json is None:
+            self._data_json = json.dumps(
+                {"columns": self.columns, "rows": self.rows(), "count": self.num_rows},
+                separators=(",", ":"),
+            ).encode("utf-8")
+        return self._data_json
+
+    def encode(self, extra: Optional[Dict[str, Any]] = None) -> bytes:
+        """Encode to the binary layout; ``extra`` is stored in the header."""
+
+        blocks: List[bytes] = []
+        layout: List[Dict[str, Any]] = []
+        offset = 0
+
+        def add_block(raw: bytes) -> List[int]:
+            nonlocal offset
+            padded = raw + b"\0" * (-len(raw) % _ALIGN)
+            blocks.append(padded)
+            position = [offset, len(raw)]
+            offset += len(padded)
+            return position
+
+        for name in self.columns:
+            column = self.data[name]
+            layout.append(
+                {"name": name, "kind": column.kind, "blocks": [add_block(b) for b in column.blocks()]}
+            )
+        data_json_block = add_block(bytes(self.data_json))
+
+        header = json.dumps(
+            {
+                "num_rows": self.num_rows,
+                "columns": layout,
+                "data_json": data_json_block,
+                "extra": extra or {},
+            }
+        ).encode("utf-8")
+        header += b" " * (-(len(header) + _PREFIX.size) % _ALIGN)
+        return _PREFIX.pack(MAGIC, len(header)) + header + b"".join(blocks)
+
+    @classmethod
+    def decode(cls, buffer: Union[bytes, memoryview]) -> "ColumnarReport":
+        """Decode without copying: column data stays views into ``buffer``."""
+
+        view = memoryview(buffer)
+        report, _ = decode_with_header(view)
+        return report
+
+
+def decode_with_header(view: memoryview) -> Tuple[ColumnarReport, Dict[str, Any]]:
+    """Decode ``view`` and also return the ``extra`` header mapping."""
+
+    magic, header_len = _PREFIX.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a columnar report buffer")
+    header = json.loads(bytes(view[_PREFIX.size:_PREFIX.size + header_len]))
+    base = _PREFIX.size + header_len
+
+    def block(position: List[int]) -> memoryview:
+        start, length = position
+        return view[base + start:base + start + length]
+
+    data: Dict[str, Column] = {}
+    columns: List[str] = []
+    for spec in header["columns"]:
+        columns.append(spec["name"])
+        first, second = (block(p) for p in spec["blocks"])
+        if spec["kind"] == "number":
+            data[spec["name"]] = NumberColumn(first.cast("d"), second.cast("B"))
+        else:
+            data[spec["name"]] = StringColumn(second, first.cast("q"), spec["kind"])
+
+    report = ColumnarReport(columns, data, header["num_rows"], block(header["data_json"]))
+    return report, header.get("extra", {})
+
+
+def map_report_file(path: Union[str, Path]) -> Tuple[ColumnarReport, Dict[str, Any], int]:
+    """Memory-map an encoded report read-only and decode it without copying.
+
+    Returns the report, its ``extra`` header mapping and the file size. The
+    mapping outlives the file descriptor and is released once the report's
+    column views are garbage collected.
+    """
+
+    with open(path, "rb") as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    report, extra = decode_with_header(memoryview(buffer))
+    return report, extra, len(buffer)
+
+
+__all__ = [
+    "ColumnarReport",
+    "NumberColumn",
+    "RowSelection",
+    "StringColumn",
+    "build_column",
+    "coerce_value",
+    "decode_with_header",
+    "map_report_file",
+]
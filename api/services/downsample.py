@@ -0,0 +1,129 @@
+"""Shape-preserving downsampling of time-series reports.
+
+Charts only need a few hundred points to draw a faithful line, no matter how
+many rows a report holds. :func:`downsample` selects ``max_points`` rows
+with Largest-Triangle-Three-Buckets (LTTB) over the report's time column,
+in one pass over all numeric series: a candidate row's triangle area is the
+sum over series of each series' area scaled by its range, so a peak in any
+one series still wins its bucket. Every bucket contributes exactly one row,
+so the whole budget is used whatever the number of series.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from services.columnar import Column, ColumnarReport, NumberColumn
+
+# Column names treated as the x axis, in order of preference.
+TIME_COLUMNS = ("timestamp", "datetime", "date", "hour", "day", "week", "month")
+
+
+def find_time_column(report: ColumnarReport) -> Optional[str]:
+    """Return the report's time column, or ``None`` if it is not a time series."""
+
+    for name in TIME_COLUMNS:
+        if name in report.data:
+            return name
+    return None
+
+
+def _time_value(value: object) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    text = value + "-01" if len(value) == 7 else value  # "YYYY-MM" months
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def time_axis(column: Column) -> List[float]:
+    """x values for ``column``; falls back to row positions if any value is not a time."""
+
+    values = [_time_value(value) for value in column]
+    if any(value is None for value in values):
+        return [float(index) for index in range(len(values))]
+    return values  # type: ignore[return-value]
+
+
+def lttb(x: Sequence[float], y: Sequence[float], threshold: int) -> List[int]:
+    """Return the indexes of ``threshold`` points chosen by LTTB (``x`` sorted)."""
+
+    return lttb_multi(x, [y], threshold)
+
+
+def lttb_multi(x: Sequence[float], ys: Sequence[Sequence[float]], threshold: int) -> List[int]:
+    """LTTB over several series sharing ``x``; one point's area is the sum over series.
+
+    Each series is scaled by its range so that no series dominates the choice.
+    """
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    scales = [1.0 / ((max(y) - min(y)) or 1.0) for y in ys]
+
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex.
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / span
+        avg_ys = [sum(y[next_start:next_end]) / span for y in ys]
+
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        ax = x[previous]
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = 0.0
+            for y, avg_y, scale in zip(ys, avg_ys, scales):
+                ay = y[previous]
+                area += scale * abs((ax - avg_x) * (y[index] - ay) - (ax - x[index]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = index, area
+        selected.append(best)
+        previous = best
+
+    selected.append(n - 1)
+    return selected
+
+
+def downsample(report: ColumnarReport, max_points: int) -> ColumnarReport:
+    """Return ``report`` reduced to ``max_points`` rows in time order.
+
+    Reports without a time column or numeric series, or that are already small
+    enough, are returned unchanged.
+    """
+
+    time_column = find_time_column(report)
+    if time_column is None or report.num_rows <= max_points:
+        return report
+    series = [
+        name
+        for name in report.columns
+        if name != time_column and report.data[name].kind == "number"
+    ]
+    if not series:
+        return report
+
+    x = time_axis(report.column(time_column))
+    order = sorted(range(report.num_rows), key=lambda index: (x[index], index))
+    xs = [x[index] for index in order]
+    ys = []
+    for name in series:
+        column = report.data[name]
+        values = column.values if isinstance(column, NumberColumn) else list(column)
+        ys.append([float(values[index]) for index in order])
+
+    return report.take([order[position] for position in lttb_multi(xs, ys, max_points)])
+
+
+__all__ = ["TIME_COLUMNS", "downsample", "find_time_column", "lttb", "lttb_multi", "time_axis"]
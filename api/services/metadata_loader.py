@@ -0,0 +1,173 @@
+"""Dashboard metadata loaded from dbt artifacts with precomputed responses.
+
+Dashboards are declared as dbt ``exposures`` of type ``dashboard``; access
+groups and KPIs are read from each exposure's ``meta`` block::
+
+    exposures:
+      - name: exec_revenue
+        label: Executive Revenue Dashboard
+        type: dashboard
+        meta:
+          dashboard_id: exec-revenue
+          groups: [C_SUITE, FINANCE]
+          kpis: [ARR, MRR]
+
+The manifest is parsed off the request path in a background thread whenever
+its mtime/size changes. Each parse produces an immutable
+:class:`MetadataSnapshot` holding id and group indexes plus pre-serialized
+JSON bodies, and is swapped in with a single reference assignment, so
+requests never wait on a reload.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.bi import DashboardMetadata, DashboardMetadataListResponse
+from services.report_cache import FileVersion, file_version
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataSnapshot:
+    """Immutable, indexed view of all dashboard metadata."""
+
+    def __init__(self, dashboards: Iterable[DashboardMetadata], version: Optional[FileVersion] = None) -> None:
+        self.version = version
+        self.dashboards: List[DashboardMetadata] = list(dashboards)
+        self.by_id: Dict[str, DashboardMetadata] = {d.id: d for d in self.dashboards}
+
+        self.by_group: Dict[str, List[DashboardMetadata]] = {}
+        for dashboard in self.dashboards:
+            for group in dashboard.groups:
+                self.by_group.setdefault(group, []).append(dashboard)
+
+        self.list_body = self._list_body(self.dashboards)
+        self.group_bodies: Dict[str, bytes] = {
+            group: self._list_body(items) for group, items in self.by_group.items()
+        }
+        self.item_bodies: Dict[str, bytes] = {
+            d.id: d.model_dump_json().encode("utf-8") for d in self.dashboards
+        }
+        self.empty_list_body = self._list_body([])
+
+    @staticmethod
+    def _list_body(dashboards: List[DashboardMetadata]) -> bytes:
+        response = DashboardMetadataListResponse(dashboards=dashboards, count=len(dashboards))
+        return response.model_dump_json().encode("utf-8")
+
+    def list_response(self, group: Optional[str] = None) -> bytes:
+        """Return the serialized list response, optionally for one access group."""
+
+        if group is None:
+            return self.list_body
+        return self.group_bodies.get(group, self.empty_list_body)
+
+
+def exposure_to_dashboard(exposure: Dict[str, Any]) -> Optional[DashboardMetadata]:
+    """Map a dbt exposure to :class:`DashboardMetadata`; non-dashboards return ``None``."""
+
+    if exposure.get("type") != "dashboard":
+        return None
+
+    meta = exposure.get("meta") or exposure.get("config", {}).get("meta") or {}
+    name = exposure["name"]
+    return DashboardMetadata(
+        id=meta.get("dashboard_id") or name.replace("_", "-"),
+        name=exposure.get("label") or name,
+        description=exposure.get("description") or "",
+        groups=list(meta.get("groups", [])),
+        kpis=list(meta.get("kpis", [])),
+    )
+
+
+class MetadataLoader:
+    """Keeps the current :class:`MetadataSnapshot` in sync with a dbt manifest."""
+
+    def __init__(
+        self,
+        manifest_path: Optional[str] = None,
+        *,
+        fallback: Iterable[DashboardMetadata] = (),
+        poll_interval: float = 30.0,
+    ) -> None:
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.poll_interval = poll_interval
+        self._snapshot = MetadataSnapshot(fallback)
+        # Per-exposure cache so unchanged exposures are not re-validated on reload.
+        self._parsed: Dict[str, Tuple[Dict[str, Any], Optional[DashboardMetadata]]] = {}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> MetadataSnapshot:
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """Reload the manifest if it changed since the last load; return ``True`` on swap."""
+
+        if self.manifest_path is None or not self.manifest_path.exists():
+            return False
+
+        with self._reload_lock:
+            version = file_version(self.manifest_path)
+            if version == self._snapshot.version:
+                return False
+
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as handle:
+                    manifest = json.load(handle)
+                dashboards = self._dashboards_from(manifest.get("exposures", {}))
+            except Exception as exc:  # keep serving the previous snapshot
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                logger.warning("Failed to load dbt manifest %s: %s", self.manifest_path, exc)
+                return False
+
+            self._snapshot = MetadataSnapshot(dashboards, version=version)
+            self.last_error = None
+            logger.info("Loaded %d dashboards from %s", len(dashboards), self.manifest_path)
+            return True
+
+    def _dashboards_from(self, exposures: Dict[str, Any]) -> List[DashboardMetadata]:
+        parsed: Dict[str, Tuple[Dict[str, Any], Optional[DashboardMetadata]]] = {}
+        dashboards: List[DashboardMetadata] = []
+        for unique_id, exposure in sorted(exposures.items()):
+            previous = self._parsed.get(unique_id)
+            if previous is not None and previous[0] == exposure:
+                dashboard = previous[1]
+            else:
+                dashboard = exposure_to_dashboard(exposure)
+            parsed[unique_id] = (exposure, dashboard)
+            if dashboard is not None:
+                dashboards.append(dashboard)
+        self._parsed = parsed
+        return dashboards
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """Start watching the manifest in a daemon thread (no-op without a path)."""
+
+        if self.manifest_path is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dbt-metadata-loader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+__all__ = ["MetadataLoader", "MetadataSnapshot", "exposure_to_dashboard"]
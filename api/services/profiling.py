@@ -0,0 +1,246 @@
+"""Opt-in profiling of individual API requests.
+
+Two ways to get a profile, both off by default:
+
+* **On demand.** With ``PROFILE_SECRET`` set, a request carrying a valid
+  ``X-Profile-Signature`` header runs under the profiler and gets the profile
+  back instead of its normal body. The signature is
+  ``<expires>.<hex hmac-sha256(secret, "<expires>:<METHOD> <path?query>")>``
+  (see :func:`sign_profile_request`), so it is bound to one URL and expires.
+  ``X-Profile-Format`` picks ``html`` (default), ``speedscope`` or ``text``.
+* **Sampled.** ``PROFILE_SAMPLE_RATE`` (0.0-1.0) profiles that fraction of
+  requests and writes the profiles to ``PROFILE_DIR``, keeping only the newest
+  ``PROFILE_MAX_FILES``.
+
+pyinstrument is used when installed (statistical, async-aware, renders HTML
+and speedscope JSON); otherwise the stdlib ``cProfile`` is used and profiles
+are rendered as text sorted by cumulative time.
+
+Only one request is profiled at a time per process: profilers hook the whole
+thread, so overlapping profiles would corrupt each other. While one runs,
+signed requests get ``409 Conflict`` and sampling is skipped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import hashlib
+import hmac
+import io
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = b"x-profile-signature"
+FORMAT_HEADER = b"x-profile-format"
+FORMATS = ("html", "speedscope", "text")
+
+# Held while a request is being profiled; see the module docstring.
+_PROFILE_ACTIVE = threading.Lock()
+
+
+def _request_target(method: str, path: str, query_string: bytes) -> str:
+    target = path + ("?" + query_string.decode("latin-1") if query_string else "")
+    return f"{method.upper()} {target}"
+
+
+def _signature(secret: str, expires: int, target: str) -> str:
+    message = f"{expires}:{target}".encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def sign_profile_request(secret: str, url: str, *, method: str = "GET", ttl: int = 300) -> str:
+    """Return an ``X-Profile-Signature`` value for ``url`` (path plus query)."""
+
+    path, _, query = url.partition("?")
+    expires = int(time.time()) + ttl
+    return f"{expires}.{_signature(secret, expires, _request_target(method, path, query.encode('latin-1')))}"
+
+
+def verify_signature(secret: str, value: str, method: str, path: str, query_string: bytes) -> bool:
+    expires_text, _, signature = value.partition(".")
+    try:
+        expires = int(expires_text)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    expected = _signature(secret, expires, _request_target(method, path, query_string))
+    return hmac.compare_digest(signature, expected)
+
+
+def _start_profiler() -> Any:
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(profiler: Any) -> None:
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+def render_profile(profiler: Any, fmt: str = "html") -> Tuple[bytes, str, str]:
+    """Render a stopped profiler as ``(body, media type, file suffix)``."""
+
+    if isinstance(profiler, cProfile.Profile) or fmt == "text":
+        if isinstance(profiler, cProfile.Profile):
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(60)
+            text = stream.getvalue()
+        else:
+            text = profiler.output_text()
+        return text.encode("utf-8"), "text/plain; charset=utf-8", ".txt"
+    if fmt == "speedscope":
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        return profiler.output(SpeedscopeRenderer()).encode("utf-8"), "application/json", ".speedscope.json"
+    return profiler.output_html().encode("utf-8"), "text/html; charset=utf-8", ".html"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware implementing signed on-demand and sampled profiling."""
+
+    def __init__(
+        self,
+        app,
+        *,
+        secret: Optional[str] = None,
+        sample_rate: float = 0.0,
+        directory: str = "/tmp/bi-profiles",
+        max_files: int = 100,
+    ) -> None:
+        self.app = app
+        self.secret = secret or None
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def _requested_format(self, scope) -> Optional[str]:
+        if self.secret is None:
+            return None
+        headers = dict(scope.get("headers", []))
+        signature = headers.get(SIGNATURE_HEADER)
+        if signature is None:
+            return None
+        valid = verify_signature(
+            self.secret,
+            signature.decode("latin-1"),
+            scope["method"],
+            scope["path"],
+            scope.get("query_string", b""),
+        )
+        if not valid:
+            logger.warning("Ignoring invalid profile signature for %s", scope["path"])
+            return None
+        fmt = headers.get(FORMAT_HEADER, b"html").decode("latin-1")
+        return fmt if fmt in FORMATS else "html"
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        fmt = self._requested_format(scope)
+        sampled = fmt is None and self.sample_rate > 0 and random.random() < self.sample_rate
+        if fmt is None and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        if not _PROFILE_ACTIVE.acquire(blocking=False):
+            if fmt is not None:
+                await self._send(send, 409, b"Another request is being profiled", "text/plain; charset=utf-8")
+            else:
+                await self.app(scope, receive, send)
+            return
+        try:
+            if fmt is not None:
+                await self._profile_and_return(scope, receive, send, fmt)
+            else:
+                await self._profile_and_store(scope, receive, send)
+        finally:
+            _PROFILE_ACTIVE.release()
+
+    @staticmethod
+    async def _send(send, status: int, body: bytes, media_type: str, headers=()) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", media_type.encode("latin-1")),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"cache-control", b"no-store"),
+                    *headers,
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _profile_and_return(self, scope, receive, send, fmt: str) -> None:
+        status_code = 500
+
+        async def discard(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        profiler = _start_profiler()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            _stop_profiler(profiler)
+
+        body, media_type, _ = await asyncio.to_thread(render_profile, profiler, fmt)
+        await self._send(
+            send, 200, body, media_type, [(b"x-profiled-status", str(status_code).encode("latin-1"))]
+        )
+
+    async def _profile_and_store(self, scope, receive, send) -> None:
+        profiler = _start_profiler()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _stop_profiler(profiler)
+            try:
+                await asyncio.to_thread(self._store, scope, profiler)
+            except OSError as exc:
+                logger.warning("Could not store sampled profile: %s", exc)
+
+    def _store(self, scope, profiler: Any) -> Path:
+        body, _, suffix = render_profile(profiler)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        path = self.directory / f"{time.time_ns()}-{scope['method'].lower()}-{slug}{suffix}"
+        path.write_bytes(body)
+
+        profiles = sorted(
+            (p for p in self.directory.iterdir() if p.is_file()), key=lambda p: p.name, reverse=True
+        )
+        for old in profiles[self.max_files:]:
+            old.unlink(missing_ok=True)
+        return path
+
+
+__all__ = [
+    "ProfilingMiddleware",
+    "render_profile",
+    "sign_profile_request",
+    "verify_signature",
+]
@@ -0,0 +1,182 @@
+"""In-process cache of parsed report data with stale-while-revalidate policies.
+
+Each entry remembers the source version it was built from and when that
+version was last confirmed. Within a report's ``ttl`` the entry is served
+without touching the source. Between ``ttl`` and ``max_stale`` it is still
+served immediately while a single background refresh revalidates it. Past
+``max_stale`` the caller must revalidate synchronously. Refresh failures keep
+the last good data and are recorded for ``/health``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from services.columnar import ColumnarReport
+
+# (st_mtime_ns, st_size) of the source file; changes whenever the file is rewritten.
+FileVersion = Tuple[int, int]
+
+# Derived views (e.g. downsampled variants) kept per entry; oldest evicted first.
+MAX_DERIVED_PER_ENTRY = 32
+
+
+def file_version(path: Path) -> FileVersion:
+    """Return a cheap version stamp for ``path`` based on ``os.stat``."""
+
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Freshness settings for one report, in seconds."""
+
+    ttl: float
+    max_stale: float
+
+
+@dataclass
+class CacheEntry:
+    """Parsed report data along with the source version(s) it was built from."""
+
+    version: Hashable
+    data: ColumnarReport
+    validated_at: float = field(default_factory=time.monotonic)
+    derived: Dict[Hashable, ColumnarReport] = field(default_factory=dict)
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (time.monotonic() if now is None else now) - self.validated_at
+
+
+@dataclass
+class RefreshFailure:
+    """Most recent refresh error for a report."""
+
+    error: str
+    failed_at: float
+    consecutive_failures: int
+
+
+class ReportCache:
+    """Thread-safe mapping of report id to the latest parsed :class:`ColumnarReport`."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, CacheEntry] = {}
+        self._refreshing: Set[str] = set()
+        self._failures: Dict[str, RefreshFailure] = {}
+        self._lock = threading.Lock()
+
+    def entry(self, report_id: str) -> Optional[CacheEntry]:
+        return self._entries.get(report_id)
+
+    def lookup(self, report_id: str, version: Hashable) -> Optional[ColumnarReport]:
+        """Return cached data for ``report_id`` if it was built from ``version``."""
+
+        entry = self._entries.get(report_id)
+        if entry is None or entry.version != version:
+            return None
+        return entry.data
+
+    def store(self, report_id: str, version: Hashable, data: ColumnarReport) -> None:
+        with self._lock:
+            self._entries[report_id] = CacheEntry(version=version, data=data)
+            self._failures.pop(report_id, None)
+
+    def derive(
+        self,
+        report_id: str,
+        data: ColumnarReport,
+        key: Hashable,
+        build: Callable[[ColumnarReport], ColumnarReport],
+    ) -> ColumnarReport:
+        """Return ``build(data)``, cached alongside the entry that holds ``data``.
+
+        Derived views live and die with the cached version they were built from,
+        so a reloaded report never serves views of its previous version.
+        """
+
+        entry = self._entries.get(report_id)
+        if entry is None or entry.data is not data:
+            return build(data)
+        derived = entry.derived.get(key)
+        if derived is None:
+            derived = build(data)
+            with self._lock:
+                if len(entry.derived) >= MAX_DERIVED_PER_ENTRY:
+                    entry.derived.pop(next(iter(entry.derived)))
+                entry.derived[key] = derived
+        return derived
+
+    def mark_validated(self, report_id: str) -> None:
+        """Record that the cached version was just confirmed against the source."""
+
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is not None:
+                entry.validated_at = time.monotonic()
+            self._failures.pop(report_id, None)
+
+    def begin_refresh(self, report_id: str) -> bool:
+        """Claim the background refresh for ``report_id``; ``False`` if one is running."""
+
+        with self._lock:
+            if report_id in self._refreshing:
+                return False
+            self._refreshing.add(report_id)
+            return True
+
+    def end_refresh(self, report_id: str, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._refreshing.discard(report_id)
+            if error is not None:
+                self._record_failure(report_id, error)
+
+    def record_failure(self, report_id: str, error: BaseException) -> None:
+        with self._lock:
+            self._record_failure(report_id, error)
+
+    def _record_failure(self, report_id: str, error: BaseException) -> None:
+        previous = self._failures.get(report_id)
+        self._failures[report_id] = RefreshFailure(
+            error=getattr(error, "detail", None) or f"{type(error).__name__}: {error}",
+            failed_at=time.time(),
+            consecutive_failures=(previous.consecutive_failures if previous else 0) + 1,
+        )
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-report cache age and refresh failure details for health checks."""
+
+        now = time.monotonic()
+        with self._lock:
+            report_ids = set(self._entries) | set(self._failures)
+            result: Dict[str, Dict[str, Any]] = {}
+            for report_id in sorted(report_ids):
+                entry = self._entries.get(report_id)
+                failure = self._failures.get(report_id)
+                result[report_id] = {
+                    "age_seconds": round(entry.age(now), 3) if entry else None,
+                    "refreshing": report_id in self._refreshing,
+                    "last_error": failure.error if failure else None,
+                    "consecutive_failures": failure.consecutive_failures if failure else 0,
+                }
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+
+
+__all__ = [
+    "CacheEntry",
+    "CachePolicy",
+    "FileVersion",
+    "RefreshFailure",
+    "ReportCache",
+    "file_version",
+]
@@ -0,0 +1,163 @@
+"""Report snapshots shared between uvicorn workers through memory-mapped files.
+
+With ``uvicorn index:app --workers N`` every worker is a separate process. To
+avoid N parsed copies of each report, the first worker that needs a report
+for a given source version takes an exclusive ``flock`` on the report's lock
+file, parses the CSV once and writes the encoded :class:`ColumnarReport` to
+``<report>.<generation>.snap``. It then publishes the new generation number
+by atomically replacing ``<report>.current``. Every worker (including the
+writer) maps the snapshot read-only, and column data is decoded as views into
+the shared page cache.
+
+Point ``REPORT_SNAPSHOT_DIR`` at a tmpfs such as ``/dev/shm/bi-reports`` so the
+snapshots live in shared memory rather than on disk.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from services.columnar import ColumnarReport, map_report_file
+from services.report_cache import FileVersion
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MappedSnapshot:
+    """A report mapped from a snapshot file, plus its provenance."""
+
+    generation: int
+    source_version: Optional[FileVersion]
+    report: ColumnarReport
+    size: int
+
+
+class SnapshotStore:
+    """Publishes and maps per-report snapshots in a shared directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._mapped: Dict[str, MappedSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def _pointer_path(self, report_id: str) -> Path:
+        return self.directory / f"{report_id}.current"
+
+    def _snapshot_path(self, report_id: str, generation: int) -> Path:
+        return self.directory / f"{report_id}.{generation}.snap"
+
+    def current_generation(self, report_id: str) -> int:
+        """Return the published generation for ``report_id`` (0 if none)."""
+
+        try:
+            return int(self._pointer_path(report_id).read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _map(self, report_id: str, generation: int) -> Optional[MappedSnapshot]:
+        mapped = self._mapped.get(report_id)
+        if mapped is not None and mapped.generation == generation:
+            return mapped
+
+        try:
+            report, extra, size = map_report_file(self._snapshot_path(report_id, generation))
+        except FileNotFoundError:
+            return None
+
+        source = extra.get("source_version")
+        mapped = MappedSnapshot(
+            generation=generation,
+            source_version=tuple(source) if source else None,  # type: ignore[arg-type]
+            report=report,
+            size=size,
+        )
+        # Older mappings are released once no response still references them.
+        self._mapped[report_id] = mapped
+        return mapped
+
+    def current(self, report_id: str) -> Optional[MappedSnapshot]:
+        """Map the currently published snapshot for ``report_id``, if any."""
+
+        generation = self.current_generation(report_id)
+        if generation == 0:
+            return None
+        with self._lock:
+            return self._map(report_id, generation)
+
+    @contextmanager
+    def _exclusive(self, report_id: str) -> Iterator[None]:
+        with open(self.directory / f"{report_id}.lock", "a+b") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def publish(
+        self,
+        report_id: str,
+        report: ColumnarReport,
+        source_version: Optional[FileVersion] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Write ``report`` as the next generation and return the generation number.
+
+        Callers must hold the report's exclusive lock (see :meth:`get_or_build`).
+        """
+
+        previous = self.current_generation(report_id)
+        generation = previous + 1
+        header = {"source_version": list(source_version) if source_version else None, **(extra or {})}
+
+        path = self._snapshot_path(report_id, generation)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as handle:
+            handle.write(report.encode(extra=header))
+        os.replace(tmp_path, path)
+
+        pointer = self._pointer_path(report_id)
+        pointer_tmp = pointer.with_suffix(".tmp")
+        pointer_tmp.write_text(str(generation))
+        os.replace(pointer_tmp, pointer)
+
+        if previous:
+            # Workers that still map the old file keep their pages until they switch.
+            self._snapshot_path(report_id, previous).unlink(missing_ok=True)
+
+        logger.info("Published snapshot %s generation %d", report_id, generation)
+        return generation
+
+    def get_or_build(
+        self,
+        report_id: str,
+        source_version: FileVersion,
+        build: Callable[[], ColumnarReport],
+    ) -> MappedSnapshot:
+        """Return the snapshot for ``source_version``, building it at most once across workers."""
+
+        mapped = self.current(report_id)
+        if mapped is not None and mapped.source_version == source_version:
+            return mapped
+
+        with self._exclusive(report_id):
+            # Another worker may have published while we waited for the lock.
+            mapped = self.current(report_id)
+            if mapped is not None and mapped.source_version == source_version:
+                return mapped
+
+            self.publish(report_id, build(), source_version)
+            mapped = self.current(report_id)
+            assert mapped is not None
+            return mapped
+
+
+__all__ = ["MappedSnapshot", "SnapshotStore"]
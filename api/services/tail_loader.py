@@ -0,0 +1,164 @@
+"""Append-aware CSV loading for reports that only grow at the end.
+
+Daily and monthly reports (``field_ops.csv``, ``exec_revenue.csv``) change by
+having rows appended. After a full parse, :class:`TailLoader` remembers how
+many bytes it consumed plus digests of the header line and of the last row
+it processed. On the next load it re-reads just those two lines; if they are
+unchanged, only the bytes after the consumed offset are parsed and appended
+to the previous :class:`ColumnarReport`, so the refresh cost tracks the size
+of the delta. Anything else (a file that did not grow, an edited header or
+last row, a file that does not end in a newline, quoted fields spanning
+lines) falls back to a full reload. A trailing partial line is left for the
+next load. Edits elsewhere in the prefix that coincide with an append are
+not detected: the loader relies on writers only ever appending.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from models.bi import PrimitiveValue
+from services.columnar import ColumnarReport, coerce_value
+
+Rows = List[Dict[str, PrimitiveValue]]
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def parse_csv_text(text: str, columns: Optional[List[str]] = None) -> Tuple[List[str], Rows]:
+    """Parse CSV text the same way the report loader always has."""
+
+    reader = csv.DictReader(io.StringIO(text), fieldnames=columns)
+    rows = [{key: coerce_value(value) for key, value in row.items()} for row in reader]
+    return (list(reader.fieldnames) if reader.fieldnames else []), rows
+
+
+def _one_row_per_line(data: bytes, rows: Rows, header_lines: int) -> bool:
+    lines = sum(1 for line in data.splitlines() if line.strip())
+    return lines - header_lines == len(rows)
+
+
+@dataclass(frozen=True)
+class TailState:
+    """How much of a file has been parsed and how to recognise its prefix."""
+
+    offset: int
+    header_digest: bytes
+    last_row_start: int
+    last_row_digest: bytes
+
+
+class TailLoader:
+    """Loads CSV reports, parsing only appended rows when the prefix is unchanged."""
+
+    def __init__(self) -> None:
+        self._states: Dict[str, Tuple[TailState, ColumnarReport]] = {}
+        # One lock per file, so a slow parse of one report does not hold up
+        # loads of the others; ``_lock`` only guards the lock table.
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _path_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def load(self, path: Path, track: bool = True) -> Tuple[ColumnarReport, str]:
+        """Return the report at ``path`` and how it was loaded: ``full``, ``append`` or ``unchanged``.
+
+        With ``track=False`` the file is always parsed in full and no state is
+        kept for it, for callers that keep the result somewhere else (e.g. a
+        shared snapshot) and would otherwise pin a second copy in memory.
+        """
+
+        key = str(path)
+        with self._path_lock(key), open(path, "rb") as handle:
+            if not track:
+                self._states.pop(key, None)
+                return self._load_full(handle)[1], "full"
+
+            previous = self._states.get(key)
+            if previous is not None:
+                appended = self._load_appended(handle, *previous)
+                if appended is not None:
+                    state, report, mode = appended
+                    self._states[key] = (state, report)
+                    return report, mode
+
+            state, report = self._load_full(handle)
+            if state is not None:
+                self._states[key] = (state, report)
+            else:
+                self._states.pop(key, None)
+            return report, "full"
+
+    def forget(self, path: Path) -> None:
+        key = str(path)
+        with self._path_lock(key):
+            self._states.pop(key, None)
+
+    @staticmethod
+    def _load_full(handle: BinaryIO) -> Tuple[Optional[TailState], ColumnarReport]:
+        handle.seek(0)
+        data = handle.read()
+        columns, rows = parse_csv_text(data.decode("utf-8"))
+        report = ColumnarReport.from_rows(columns, rows)
+
+        header_end = data.find(b"\n") + 1
+        if not header_end or not data.endswith(b"\n") or not _one_row_per_line(data, rows, 1):
+            return None, report
+        last_row_start = data.rfind(b"\n", 0, len(data) - 1) + 1
+        state = TailState(
+            offset=len(data),
+            header_digest=_digest(data[:header_end]),
+            last_row_start=last_row_start,
+            last_row_digest=_digest(data[last_row_start:]),
+        )
+        return state, report
+
+    @staticmethod
+    def _load_appended(
+        handle: BinaryIO, state: TailState, report: ColumnarReport
+    ) -> Optional[Tuple[TailState, ColumnarReport, str]]:
+        size = os.fstat(handle.fileno()).st_size
+        if size <= state.offset:
+            # Callers only reload after the file changed; without growth that
+            # was a rewrite, not an append.
+            return None
+
+        handle.seek(0)
+        if _digest(handle.readline()) != state.header_digest:
+            return None
+        handle.seek(state.last_row_start)
+        if _digest(handle.read(state.offset - state.last_row_start)) != state.last_row_digest:
+            return None
+
+        tail = handle.read(size - state.offset)
+        end = tail.rfind(b"\n") + 1
+        if end == 0:
+            return state, report, "unchanged"
+
+        tail = tail[:end]
+        _, rows = parse_csv_text(tail.decode("utf-8"), columns=report.columns)
+        if not _one_row_per_line(tail, rows, 0):
+            return None
+
+        last_row_start = tail.rfind(b"\n", 0, end - 1) + 1
+        new_state = TailState(
+            offset=state.offset + end,
+            header_digest=state.header_digest,
+            last_row_start=state.offset + last_row_start,
+            last_row_digest=_digest(tail[last_row_start:]),
+        )
+        return new_state, report.append_rows(rows), "append"
+
+
+__all__ = ["TailLoader", "TailState", "parse_csv_text"]
@@ -0,0 +1,68 @@
+"""Startup warm-up of report and metadata caches, used for readiness gating.
+
+The application lifespan runs every warm-up task concurrently in worker
+threads right after startup. ``/ready`` answers 503 until all of them have
+finished and 200 afterwards, with per-task timings and sizes, so a load
+balancer only routes traffic to instances whose caches are warm.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# A warm-up task loads something into memory and describes what it loaded.
+WarmupTask = Callable[[], Dict[str, Any]]
+
+
+class WarmupTracker:
+    """Runs warm-up tasks once and records their outcome."""
+
+    def __init__(self) -> None:
+        self.started_at: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.duration_ms is not None
+
+    async def _run_task(self, name: str, task: WarmupTask) -> None:
+        started = time.perf_counter()
+        try:
+            details = await asyncio.to_thread(task)
+        except Exception as exc:  # a cold report should not keep the instance out of rotation
+            logger.warning("Warm-up of %s failed: %s", name, exc)
+            result: Dict[str, Any] = {
+                "status": "error",
+                "error": getattr(exc, "detail", None) or f"{type(exc).__name__}: {exc}",
+            }
+        else:
+            result = {"status": "ok", **details}
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        self.results[name] = result
+
+    async def run(self, tasks: Mapping[str, WarmupTask]) -> None:
+        """Run ``tasks`` concurrently and mark the tracker ready when all are done."""
+
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.results = {}
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_task(name, task) for name, task in tasks.items()))
+        self.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        logger.info("Warm-up finished in %.1f ms", self.duration_ms)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "duration_ms": self.duration_ms,
+            "tasks": dict(sorted(self.results.items())),
+        }
+
+
+__all__ = ["WarmupTask", "WarmupTracker"]
@@ -2,55 +2,153 @@
 
 from __future__ import annotations
 
+import codecs
+import io
 import json
 import logging
 import os
 import sys
+import threading
+from contextlib import ExitStack, closing
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-import boto3
-from botocore.client import BaseClient
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
 
 # Ensure the custom Airflow directory is importable without conflicting with the apache-airflow package.
 AIRFLOW_DIR = Path(__file__).resolve().parent / "airflow"
 if AIRFLOW_DIR.exists():
     sys.path.insert(0, str(AIRFLOW_DIR))
 
-from adapters import dbt_row_to_xdm_event, dbt_row_to_xdm_profile  # type: ignore  # noqa: E402
-from models import AEPIngestPayload, CustomerEvent, CustomerProfile  # type: ignore  # noqa: E402
+from checkpoints import (  # type: ignore  # noqa: E402
+    Checkpoint,
+    CheckpointStore,
+    WatermarkFilter,
+    default_checkpoint_store,
+    source_uri,
+    utc_now,
+)
+from dedup import DedupStats, RecordDeduplicator, default_deduplicator  # type: ignore  # noqa: E402
+from record_buffer import (  # type: ignore  # noqa: E402
+    DEFAULT_UPLOAD_CHUNK_BYTES,
+    RecordBuffer,
+    default_record_buffer,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import Executor
+
+    from botocore.client import BaseClient
+
+# boto3, pydantic (via adapters/models) and the AEP SDK are imported on first use
+# so that importing this module stays cheap; see tests/test_import_time.py.
+_AEP_SDK_NAMES = ("AEPClient", "IngestionClient", "QueryServiceClient")
 
-try:  # pragma: no cover - optional dependency
-    from adobe_aep_sdk import AEPClient  # type: ignore
-    from adobe_aep_sdk.modules.ingestion import IngestionClient  # type: ignore
-    from adobe_aep_sdk.modules.queryservice import QueryServiceClient  # type: ignore
-except Exception:  # pragma: no cover
-    class AEPClient:  # type: ignore[override]
-        def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
-            raise RuntimeError("adobe-aep-sdk is required to instantiate AEPClient")
+logger = logging.getLogger(__name__)
 
-    class IngestionClient:  # type: ignore[override]
-        def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
-            raise RuntimeError("adobe-aep-sdk is required to instantiate IngestionClient")
+_s3_client: Optional["BaseClient"] = None
+_s3_lock = threading.Lock()
 
-    class QueryServiceClient:  # type: ignore[override]
-        def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
-            raise RuntimeError("adobe-aep-sdk is required to instantiate QueryServiceClient")
 
+def _load_aep_sdk() -> None:
+    """Bind the AEP SDK classes (or stubs) as module globals unless already set."""
 
-logger = logging.getLogger(__name__)
-s3: BaseClient = boto3.client("s3")
+    if all(name in globals() for name in _AEP_SDK_NAMES):
+        return
+
+    try:  # pragma: no cover - optional dependency
+        from adobe_aep_sdk import AEPClient  # type: ignore
+        from adobe_aep_sdk.modules.ingestion import IngestionClient  # type: ignore
+        from adobe_aep_sdk.modules.queryservice import QueryServiceClient  # type: ignore
+    except Exception:  # pragma: no cover
+        class AEPClient:  # type: ignore[no-redef]
+            def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
+                raise RuntimeError("adobe-aep-sdk is required to instantiate AEPClient")
+
+        class IngestionClient:  # type: ignore[no-redef]
+            def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
+                raise RuntimeError("adobe-aep-sdk is required to instantiate IngestionClient")
+
+        class QueryServiceClient:  # type: ignore[no-redef]
+            def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
+                raise RuntimeError("adobe-aep-sdk is required to instantiate QueryServiceClient")
+
+    # ``setdefault`` keeps any test doubles patched onto the module.
+    globals().setdefault("AEPClient", AEPClient)
+    globals().setdefault("IngestionClient", IngestionClient)
+    globals().setdefault("QueryServiceClient", QueryServiceClient)
+
+
+def get_s3_client() -> "BaseClient":
+    """Return the process-wide S3 client, creating it on first use."""
+
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                import boto3
+
+                _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def __getattr__(name: str) -> Any:
+    # Lazily resolve ``main.s3`` and the SDK classes for callers and test patches.
+    if name == "s3":
+        return get_s3_client()
+    if name in _AEP_SDK_NAMES:
+        _load_aep_sdk()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class AEPClientConfig(Dict[str, Optional[str]]):
     """Simple mapping describing the credentials needed to bootstrap the SDK clients."""
 
 
-def load_records_from_s3(bucket: str, key: str) -> List[Dict[str, Any]]:
-    """Download a JSON payload from S3 and return the parsed records list."""
-
-    response = s3.get_object(Bucket=bucket, Key=key)
-    body = response["Body"].read()
+class PipelineContext:
+    """Lazily constructed S3 and AEP clients that can be shared across runs.
+
+    Pass the same context to several :func:`run_pipeline` calls to reuse the
+    authenticated AEP clients, or inject pre-built clients (e.g. stubs) directly.
+    Without an explicit ``s3`` client the process-wide one from
+    :func:`get_s3_client` is used.
+    """
+
+    def __init__(
+        self,
+        *,
+        s3: Optional["BaseClient"] = None,
+        clients: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self._s3 = s3
+        self._clients = clients
+        self._lock = threading.Lock()
+
+    @property
+    def s3(self) -> "BaseClient":
+        if self._s3 is None:
+            self._s3 = get_s3_client()
+        return self._s3
+
+    @property
+    def clients(self) -> Dict[str, Any]:
+        if self._clients is None:
+            with self._lock:
+                if self._clients is None:
+                    self._clients = _build_clients()
+        return self._clients
+
+    @property
+    def ingestion_client(self) -> Any:
+        return self.clients["ingestion_client"]
+
+    @property
+    def query_client(self) -> Any:
+        return self.clients["query_client"]
+
+
+def _decode_records(body: Any) -> List[Dict[str, Any]]:
     if isinstance(body, bytes):
         body_str = body.decode("utf-8")
     else:  # pragma: no cover
@@ -58,10 +156,124 @@ def load_records_from_s3(bucket: str, key: str) -> List[Dict[str, Any]]:
     return json.loads(body_str)
 
 
-def validate_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Validate incoming records, preferring XDM schemas with graceful fallbacks."""
+# Bytes read from the source object per step of the incremental JSON parser.
+_READ_CHUNK = 1 << 20
+
+
+def iter_json_records(body: Any, chunk_size: int = _READ_CHUNK) -> Iterator[Any]:
+    """Parse records from a JSON array (or NDJSON) incrementally.
+
+    ``body`` is ``bytes`` or a binary file-like object such as an S3
+    ``StreamingBody``. Only about ``chunk_size`` bytes plus the record being
+    parsed are held at a time, so a large extract is never materialized.
+    """
+
+    if isinstance(body, bytes):
+        body = io.BytesIO(body)
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text, pos, eof = "", 0, False
+    in_array: Optional[bool] = None
+
+    def fill() -> None:
+        nonlocal text, pos, eof
+        data = body.read(chunk_size)
+        eof = not data
+        text = text[pos:] + utf8.decode(data, final=eof)
+        pos = 0
+
+    while True:
+        while True:
+            while pos < len(text) and (text[pos] in " \t\r\n" or (in_array and text[pos] == ",")):
+                pos += 1
+            if pos < len(text) or eof:
+                break
+            fill()
+        if pos == len(text):
+            if in_array:
+                raise ValueError("Unterminated JSON array in source object")
+            return
+
+        if in_array is None:
+            in_array = text[pos] == "["
+            pos += in_array
+            continue
+        if in_array and text[pos] == "]":
+            return
+
+        try:
+            value, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(text) and not eof:
+            # A number at the end of the buffer may continue in the next chunk.
+            fill()
+            continue
+        pos = end
+        yield value
+
+
+class _Counted(Iterator[Any]):
+    """Iterator wrapper counting the items that passed through it."""
+
+    def __init__(self, items: Iterable[Any]) -> None:
+        self._items = iter(items)
+        self.count = 0
+
+    def __next__(self) -> Any:
+        item = next(self._items)
+        self.count += 1
+        return item
+
+
+def load_records_from_s3(
+    bucket: str, key: str, context: Optional[PipelineContext] = None
+) -> List[Dict[str, Any]]:
+    """Download a JSON payload from S3 and return the parsed records list."""
+
+    s3_client = context.s3 if context is not None else get_s3_client()
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    return _decode_records(response["Body"].read())
+
+
+def _get_object_if_changed(
+    s3_client: "BaseClient", bucket: str, key: str, checkpoint: Optional[Checkpoint]
+) -> Optional[Dict[str, Any]]:
+    """Return the ``get_object`` response, or ``None`` if the checkpointed ETag still matches.
+
+    The ETag is sent as ``IfNoneMatch`` so an unchanged object costs a single
+    304 round trip and no body transfer.
+    """
+
+    kwargs: Dict[str, Any] = {"Bucket": bucket, "Key": key}
+    if checkpoint is not None and checkpoint.etag:
+        kwargs["IfNoneMatch"] = checkpoint.etag
+
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3_client.get_object(**kwargs)
+    except ClientError as exc:
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if status == 304 or exc.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            return None
+        raise
+
+    if checkpoint is not None and checkpoint.matches(response.get("ETag"), response.get("ContentLength")):
+        response["Body"].close()
+        return None
+    return response
+
+
+def iter_validated_records(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Validate incoming records one by one, preferring XDM schemas with graceful fallbacks."""
+
+    from adapters import dbt_row_to_xdm_event, dbt_row_to_xdm_profile  # type: ignore
+    from models import CustomerEvent, CustomerProfile  # type: ignore
 
-    validated: List[Dict[str, Any]] = []
     for row in records:
         try:
             try:
@@ -75,10 +287,15 @@ def validate_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                 except Exception:
                     obj = CustomerProfile(**row)
 
-            validated.append(obj.model_dump(by_alias=True))
+            yield obj.model_dump(by_alias=True)
         except Exception as exc:  # pragma: no cover - defensive
             logger.warning("Skipping invalid record %s: %s", row, exc)
-    return validated
+
+
+def validate_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate incoming records, preferring XDM schemas with graceful fallbacks."""
+
+    return list(iter_validated_records(records))
 
 
 def _resolve_aep_config() -> AEPClientConfig:
@@ -96,6 +313,7 @@ def _resolve_aep_config() -> AEPClientConfig:
 
 
 def _build_clients() -> Dict[str, Any]:
+    _load_aep_sdk()
     config = _resolve_aep_config()
     aep_client = AEPClient(**config)
     ingestion_client = IngestionClient(aep_client)
@@ -107,6 +325,35 @@ def _build_clients() -> Dict[str, Any]:
     }
 
 
+def _pipeline_result(
+    target_key: str,
+    *,
+    batch_id: Optional[str] = None,
+    validated_in: int = 0,
+    returned_from_aep: int = 0,
+    skipped_unchanged: bool = False,
+    records_in: int = 0,
+    records_past_watermark: int = 0,
+    dedup_stats: Optional[DedupStats] = None,
+    buffer: Optional[RecordBuffer] = None,
+) -> Dict[str, Any]:
+    return {
+        "batch_id": batch_id,
+        "validated_in": validated_in,
+        "returned_from_aep": returned_from_aep,
+        "output_key": target_key,
+        "skipped_unchanged": skipped_unchanged,
+        "records_in": records_in,
+        "records_past_watermark": records_past_watermark,
+        "dedup": (dedup_stats or DedupStats()).to_dict(),
+        **({"buffer": buffer.report()} if buffer is not None else {}),
+    }
+
+
+# Validated records are deduplicated and buffered this many at a time.
+_FILTER_CHUNK = 10_000
+
+
 def run_pipeline(
     *,
     source_bucket: str,
@@ -114,48 +361,341 @@ def run_pipeline(
     target_bucket: str,
     target_key: str,
     dataset_id: str,
+    incremental: bool = True,
+    checkpoint_store: Optional[CheckpointStore] = None,
+    dedup: bool = True,
+    deduplicator: Optional[RecordDeduplicator] = None,
+    watermark_lookback: float = 0.0,
+    context: Optional[PipelineContext] = None,
+    record_buffer: Optional[RecordBuffer] = None,
+    upload_chunk_bytes: int = DEFAULT_UPLOAD_CHUNK_BYTES,
 ) -> Dict[str, Any]:
-    """Run the end-to-end flow: load → validate → ingest → query → persist results."""
-
-    records = load_records_from_s3(source_bucket, source_key)
-    validated = validate_records(records)
-
-    payload = AEPIngestPayload(dataset_id=dataset_id, records=validated)
-
-    clients = _build_clients()
-    ingestion_client: IngestionClient = clients["ingestion_client"]
-    query_client: QueryServiceClient = clients["query_client"]
-
-    batch = ingestion_client.create_batch(dataset_id=dataset_id)
-    batch_id = batch["id"]
-
-    ingestion_client.upload_batch_data(
-        batch_id=batch_id,
-        data_bytes=payload.to_ndjson().encode("utf-8"),
-    )
-    ingestion_client.commit_batch(batch_id=batch_id)
-
-    sql = f"SELECT * FROM {dataset_id} LIMIT 100"
-    query_response = query_client.execute(sql)
-    query_rows = query_response.get("results", [])
-
-    s3.put_object(
-        Bucket=target_bucket,
-        Key=target_key,
-        Body=json.dumps(query_rows).encode("utf-8"),
+    """Run the end-to-end flow: load → validate → ingest → query → persist results.
+
+    With ``incremental`` enabled (the default) the source object's ETag and
+    event-timestamp watermark are checkpointed after a successful run. Unchanged
+    objects are skipped and only records at or past the watermark (less
+    ``watermark_lookback`` seconds) are ingested; dedup drops the repeats.
+
+    With ``dedup`` enabled (the default) records whose XDM ``_id`` was already
+    ingested by an earlier run are dropped before upload; hit/miss counters are
+    returned under ``"dedup"``.
+
+    The source object (a JSON array or NDJSON) is parsed as a stream, and
+    validated records go into ``record_buffer`` (by default one configured via
+    ``AEP_BUFFER_*``), which spills to a temp file past its memory budget.
+    They are uploaded as NDJSON files of at most ``upload_chunk_bytes`` within
+    one batch. Spill volume and peak memory are returned under ``"buffer"``.
+
+    Clients come from ``context``; a fresh :class:`PipelineContext` is used
+    when none is given, so AEP clients are only built if there is data to ingest.
+    """
+
+    context = context or PipelineContext()
+    source = source_uri(source_bucket, source_key)
+    with ExitStack() as resources:
+        checkpoint: Optional[Checkpoint] = None
+        if incremental:
+            if checkpoint_store is None:
+                checkpoint_store = resources.enter_context(closing(default_checkpoint_store()))
+            checkpoint = checkpoint_store.get(source)
+
+        buffer = default_record_buffer() if record_buffer is None else record_buffer
+        response = _get_object_if_changed(context.s3, source_bucket, source_key, checkpoint)
+        if response is None:
+            logger.info("Skipping %s: unchanged since last checkpoint", source)
+            return _pipeline_result(target_key, skipped_unchanged=True, buffer=buffer)
+
+        # The body is parsed, filtered and validated as a stream into the buffer.
+        parsed = _Counted(iter_json_records(response["Body"]))
+        watermark_filter = WatermarkFilter(
+            checkpoint.watermark if checkpoint else None, lookback=watermark_lookback
+        )
+        records = _Counted(watermark_filter(parsed) if incremental else parsed)
+
+        resources.enter_context(buffer)
+        if dedup and deduplicator is None:
+            deduplicator = resources.enter_context(closing(default_deduplicator()))
+        if dedup:
+            # Keys are staged on disk until commit; drop any left by this run.
+            deduplicator.discard_pending()
+            resources.callback(deduplicator.discard_pending)
+        dedup_stats = DedupStats()
+        validated_in = 0
+
+        validated = iter_validated_records(records)
+        while chunk := list(islice(validated, _FILTER_CHUNK)):
+            validated_in += len(chunk)
+            if dedup:
+                chunk, stats = deduplicator.filter(chunk, namespace=dataset_id)
+                dedup_stats.merge(stats)
+            buffer.extend(chunk)
+
+        watermark = watermark_filter.watermark
+        if not len(buffer):
+            logger.info("No new records to ingest for %s", source)
+            _save_checkpoint(checkpoint_store, source, response, watermark)
+            return _pipeline_result(
+                target_key,
+                validated_in=validated_in,
+                records_in=parsed.count,
+                records_past_watermark=records.count,
+                dedup_stats=dedup_stats,
+                buffer=buffer,
+            )
+
+        ingestion_client = context.ingestion_client
+        query_client = context.query_client
+
+        batch = ingestion_client.create_batch(dataset_id=dataset_id)
+        batch_id = batch["id"]
+
+        for part, data in enumerate(buffer.iter_ndjson(upload_chunk_bytes)):
+            _upload_part(ingestion_client, batch_id, part, data)
+        ingestion_client.commit_batch(batch_id=batch_id)
+        if dedup:
+            deduplicator.commit_pending()
+
+        sql = f"SELECT * FROM {dataset_id} LIMIT 100"
+        query_response = query_client.execute(sql)
+        query_rows = query_response.get("results", [])
+
+        context.s3.put_object(
+            Bucket=target_bucket,
+            Key=target_key,
+            Body=json.dumps(query_rows).encode("utf-8"),
+        )
+
+        _save_checkpoint(checkpoint_store, source, response, watermark)
+
+        return _pipeline_result(
+            target_key,
+            batch_id=batch_id,
+            validated_in=validated_in,
+            returned_from_aep=len(query_rows),
+            records_in=parsed.count,
+            records_past_watermark=records.count,
+            dedup_stats=dedup_stats,
+            buffer=buffer,
+        )
+
+
+def _upload_part(ingestion_client: Any, batch_id: str, part: int, data: bytes) -> None:
+    """Upload ``data`` as file ``part`` of a batch.
+
+    A batch holds any number of files, but uploading under an existing file
+    name replaces that file, so every part gets its own name.
+    """
+
+    ingestion_client.upload_batch_data(batch_id=batch_id, data_bytes=data, file_name=f"part-{part:05d}.json")
+
+
+def _serialize_chunk(dataset_id: str, records: List[Dict[str, Any]]) -> bytes:
+    from models import AEPIngestPayload  # type: ignore
+
+    return AEPIngestPayload(dataset_id=dataset_id, records=records).to_ndjson().encode("utf-8")
+
+
+async def run_pipeline_async(
+    *,
+    source_bucket: str,
+    source_key: str,
+    target_bucket: str,
+    target_key: str,
+    dataset_id: str,
+    incremental: bool = True,
+    checkpoint_store: Optional[CheckpointStore] = None,
+    dedup: bool = True,
+    deduplicator: Optional[RecordDeduplicator] = None,
+    watermark_lookback: float = 0.0,
+    context: Optional[PipelineContext] = None,
+    chunk_size: int = 5000,
+    queue_size: int = 2,
+    executor: Optional["Executor"] = None,
+) -> Dict[str, Any]:
+    """Asynchronous :func:`run_pipeline` that overlaps validation with uploads.
+
+    The source object is parsed as a stream into ``chunk_size`` chunks that
+    flow through stages connected by queues holding at most ``queue_size``
+    chunks, so a slow upload holds back reading and validation instead of
+    buffering the whole object:
+
+    * validate: :func:`validate_records` and NDJSON serialization run in
+      ``executor`` (one worker thread by default; a ``ProcessPoolExecutor``
+      works too), then dedup filters the chunk in its own worker thread;
+    * upload: the batch is created for the first chunk, and chunk N is
+      uploaded as file ``part-N`` of the batch while chunk N+1 is being
+      validated;
+    * commit, query and ``put_object`` once every chunk is uploaded.
+
+    Blocking S3/AEP calls run in the event loop's default executor. The first
+    error in any stage cancels the others and is re-raised, as is cancellation
+    of the caller; either way the batch is not committed and neither the
+    checkpoint nor dedup keys are saved, so the run can be retried. Returns the
+    same result dict as :func:`run_pipeline`, without the ``"buffer"`` entry.
+    """
+
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    context = context or PipelineContext()
+    source = source_uri(source_bucket, source_key)
+    with ExitStack() as resources:
+        checkpoint: Optional[Checkpoint] = None
+        if incremental:
+            if checkpoint_store is None:
+                checkpoint_store = resources.enter_context(closing(default_checkpoint_store()))
+            checkpoint = checkpoint_store.get(source)
+
+        s3_client = context.s3
+        response = await asyncio.to_thread(
+            _get_object_if_changed, s3_client, source_bucket, source_key, checkpoint
+        )
+        if response is None:
+            logger.info("Skipping %s: unchanged since last checkpoint", source)
+            return _pipeline_result(target_key, skipped_unchanged=True)
+
+        parsed = _Counted(iter_json_records(response["Body"]))
+        watermark_filter = WatermarkFilter(
+            checkpoint.watermark if checkpoint else None, lookback=watermark_lookback
+        )
+        records = _Counted(watermark_filter(parsed) if incremental else parsed)
+
+        if dedup and deduplicator is None:
+            deduplicator = resources.enter_context(closing(default_deduplicator()))
+        if dedup:
+            # Keys are staged on disk until commit; drop any left by this run
+            # (after the dedup thread below has stopped).
+            deduplicator.discard_pending()
+            resources.callback(deduplicator.discard_pending)
+        # Dedup lookups block on SQLite; one dedicated thread keeps them off the
+        # event loop and serializes access to the connection.
+        dedup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aep-dedup")
+        resources.callback(dedup_executor.shutdown)
+        dedup_stats = DedupStats()
+        validated_in = 0
+        batch_id: Optional[str] = None
+        ingestion_client: Any = None
+
+        validate_queue: "asyncio.Queue[Optional[List[Dict[str, Any]]]]" = asyncio.Queue(maxsize=queue_size)
+        upload_queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=queue_size)
+        validation_executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="aep-validate")
+
+        async def produce() -> None:
+            # Reading the body blocks, so each chunk is parsed in a worker thread.
+            while chunk := await asyncio.to_thread(lambda: list(islice(records, chunk_size))):
+                await validate_queue.put(chunk)
+            await validate_queue.put(None)
+
+        async def validate() -> None:
+            nonlocal validated_in
+            while (chunk := await validate_queue.get()) is not None:
+                validated = await loop.run_in_executor(validation_executor, validate_records, chunk)
+                validated_in += len(validated)
+                to_ingest = validated
+                if dedup:
+                    to_ingest, stats = await loop.run_in_executor(
+                        dedup_executor, partial(deduplicator.filter, validated, namespace=dataset_id)
+                    )
+                    dedup_stats.merge(stats)
+                if to_ingest:
+                    data = await loop.run_in_executor(
+                        validation_executor, _serialize_chunk, dataset_id, to_ingest
+                    )
+                    await upload_queue.put(data)
+            await upload_queue.put(None)
+
+        async def upload() -> None:
+            nonlocal batch_id, ingestion_client
+            part = 0
+            while (data := await upload_queue.get()) is not None:
+                if batch_id is None:
+                    ingestion_client = await asyncio.to_thread(lambda: context.ingestion_client)
+                    batch = await asyncio.to_thread(ingestion_client.create_batch, dataset_id=dataset_id)
+                    batch_id = batch["id"]
+                await asyncio.to_thread(_upload_part, ingestion_client, batch_id, part, data)
+                part += 1
+
+        stages = [asyncio.ensure_future(stage()) for stage in (produce, validate, upload)]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        finally:
+            if executor is None:
+                validation_executor.shutdown(wait=False, cancel_futures=True)
+
+        watermark = watermark_filter.watermark
+        if batch_id is None:
+            logger.info("No new records to ingest for %s", source)
+            _save_checkpoint(checkpoint_store, source, response, watermark)
+            return _pipeline_result(
+                target_key,
+                validated_in=validated_in,
+                records_in=parsed.count,
+                records_past_watermark=records.count,
+                dedup_stats=dedup_stats,
+            )
+
+        await asyncio.to_thread(ingestion_client.commit_batch, batch_id=batch_id)
+        if dedup:
+            await loop.run_in_executor(dedup_executor, deduplicator.commit_pending)
+
+        query_client = await asyncio.to_thread(lambda: context.query_client)
+        query_response = await asyncio.to_thread(query_client.execute, f"SELECT * FROM {dataset_id} LIMIT 100")
+        query_rows = query_response.get("results", [])
+
+        await asyncio.to_thread(
+            s3_client.put_object,
+            Bucket=target_bucket,
+            Key=target_key,
+            Body=json.dumps(query_rows).encode("utf-8"),
+        )
+
+        _save_checkpoint(checkpoint_store, source, response, watermark)
+
+        return _pipeline_result(
+            target_key,
+            batch_id=batch_id,
+            validated_in=validated_in,
+            returned_from_aep=len(query_rows),
+            records_in=parsed.count,
+            records_past_watermark=records.count,
+            dedup_stats=dedup_stats,
+        )
+
+
+def _save_checkpoint(
+    store: Optional[CheckpointStore],
+    source: str,
+    response: Dict[str, Any],
+    watermark: Optional[str],
+) -> None:
+    if store is None:
+        return
+    store.put(
+        Checkpoint(
+            source=source,
+            etag=response.get("ETag"),
+            size=response.get("ContentLength"),
+            watermark=watermark,
+            updated_at=utc_now(),
+        )
     )
 
-    return {
-        "batch_id": batch_id,
-        "validated_in": len(validated),
-        "returned_from_aep": len(query_rows),
-        "output_key": target_key,
-    }
-
 
 __all__ = [
+    "PipelineContext",
+    "get_s3_client",
     "run_pipeline",
+    "run_pipeline_async",
     "validate_records",
+    "iter_json_records",
+    "iter_validated_records",
     "load_records_from_s3",
     "AEPClient",
     "IngestionClient",
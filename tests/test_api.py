@@ -0,0 +1,430 @@
+"""Tests for the FastAPI BI service."""
+
+import json
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+sys.path.insert(0, str(API_DIR))
+
+import compile_reports  # noqa: E402
+from index import app  # noqa: E402
+from routers import bi_metadata, bi_query, health  # noqa: E402
+from services.access import load_access_policies  # noqa: E402
+from services.columnar import ColumnarReport, coerce_value  # noqa: E402
+from services.downsample import downsample  # noqa: E402
+from services.metadata_loader import MetadataLoader  # noqa: E402
+from services import profiling  # noqa: E402
+from services.profiling import ProfilingMiddleware, sign_profile_request  # noqa: E402
+from services.report_cache import CachePolicy  # noqa: E402
+from services.snapshots import SnapshotStore  # noqa: E402
+from services.tail_loader import TailLoader  # noqa: E402
+from services.warmup import WarmupTracker  # noqa: E402
+from services import telemetry  # noqa: E402
+
+# ``api/models`` and ``airflow/models.py`` share a top-level module name. The
+# API keeps its own references, so release the name for the pipeline tests.
+for _name in [name for name in sys.modules if name == "models" or name.startswith("models.")]:
+    del sys.modules[_name]
+sys.path.remove(str(API_DIR))
+
+client = TestClient(app)
+
+
+def test_query_emits_server_timing_and_uses_cache(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path)
+    bi_query.REPORT_CACHE.clear()
+    misses = telemetry.REPORT_CACHE_LOOKUPS.value("field-ops", "miss")
+    hits = telemetry.REPORT_CACHE_LOOKUPS.value("field-ops", "hit")
+
+    first = client.get("/bi/query", params={"report_id": "field-ops"})
+    second = client.get("/bi/query", params={"report_id": "field-ops"})
+
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    assert first.json()["data"]["count"] == 10
+    assert first.headers["cache-control"].startswith("public, max-age=60")
+
+    timing = first.headers["server-timing"]
+    for name in ("cache", "parse", "serialize", "total"):
+        assert f"{name};dur=" in timing
+    assert "parse;dur=" not in second.headers["server-timing"]
+
+    assert telemetry.REPORT_CACHE_LOOKUPS.value("field-ops", "miss") == misses + 1
+    assert telemetry.REPORT_CACHE_LOOKUPS.value("field-ops", "hit") == hits + 1
+
+
+def test_metrics_endpoint_exposes_prometheus_text() -> None:
+    client.get("/bi/query", params={"report_id": "exec-revenue"})
+    client.get("/bi/query", params={"report_id": "missing"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE bi_api_request_duration_seconds histogram" in body
+    assert 'bi_api_request_duration_seconds_count{method="GET",route="/bi/query",status="200"}' in body
+    assert 'route="/bi/query",status="404"' in body
+    assert 'bi_api_report_duration_seconds_bucket{report="exec-revenue",le="+Inf"}' in body
+    assert "bi_api_requests_in_flight 1" in body
+    assert 'bi_api_report_cache_lookups_total{report="exec-revenue",result="miss"}' in body
+
+
+def test_metadata_endpoints_use_indexed_snapshot() -> None:
+    listing = client.get("/bi/metadata").json()
+    ops = client.get("/bi/metadata", params={"group": "OPS"}).json()
+    unknown = client.get("/bi/metadata", params={"group": "NOBODY"}).json()
+
+    assert listing["count"] == 3
+    assert [d["id"] for d in ops["dashboards"]] == ["field-ops"]
+    assert unknown == {"dashboards": [], "count": 0}
+    assert client.get("/bi/metadata/field-ops").json()["groups"] == ["C_SUITE", "OPS"]
+    assert client.get("/bi/metadata/missing").status_code == 404
+
+
+def test_metadata_loader_reloads_dbt_exposures(tmp_path) -> None:
+    manifest = tmp_path / "manifest.json"
+    exposure = {
+        "name": "exec_revenue",
+        "label": "Revenue",
+        "type": "dashboard",
+        "description": "Revenue KPIs",
+        "meta": {"groups": ["FINANCE"], "kpis": ["ARR"]},
+    }
+    manifest.write_text(json.dumps({"exposures": {"exposure.bi.exec_revenue": exposure}}))
+
+    loader = MetadataLoader(str(manifest), fallback=bi_metadata.DASHBOARDS_METADATA)
+    assert loader.snapshot.by_id.keys() == {"exec-revenue", "field-ops", "customer-churn"}
+
+    assert loader.refresh() is True
+    assert loader.refresh() is False
+    assert list(loader.snapshot.by_id) == ["exec-revenue"]
+    assert json.loads(loader.snapshot.list_response("FINANCE"))["count"] == 1
+
+    manifest.write_text("{not json")
+    assert loader.refresh() is False
+    assert loader.last_error is not None
+    assert list(loader.snapshot.by_id) == ["exec-revenue"]
+
+
+def test_snapshots_are_built_once_and_shared_between_workers(tmp_path) -> None:
+    report = bi_query.read_csv_report("kpi-summary")
+    builds = []
+
+    def build():
+        builds.append(1)
+        return report
+
+    # Two stores over one directory stand in for two uvicorn workers.
+    writer = SnapshotStore(str(tmp_path))
+    reader = SnapshotStore(str(tmp_path))
+
+    first = writer.get_or_build("kpi-summary", (1, 100), build)
+    shared = reader.get_or_build("kpi-summary", (1, 100), build)
+
+    assert len(builds) == 1
+    assert shared.generation == first.generation == 1
+    assert isinstance(shared.report.column("current_value").values, memoryview)
+    assert shared.report.rows() == report.rows()
+    assert shared.report.data_json == report.data_json
+    assert isinstance(shared.report.data_json, memoryview)
+
+    updated = writer.get_or_build("kpi-summary", (2, 100), build)
+    assert updated.generation == 2
+    assert reader.current("kpi-summary").generation == 2
+    assert not (tmp_path / "kpi-summary.1.snap").exists()
+
+
+def test_csv_cells_are_coerced_like_the_original_loader() -> None:
+    assert [coerce_value(v) for v in ("12", "1.5", "nan", "NaN", "n/a", "", None)] == [
+        12, 1.5, "nan", "NaN", "n/a", "", None
+    ]
+
+
+def test_query_prefers_compiled_report_until_csv_changes(monkeypatch, tmp_path) -> None:
+    data_dir = tmp_path / "data"
+    shutil.copytree(bi_query.DATA_DIR, data_dir, ignore=shutil.ignore_patterns("compiled"))
+    monkeypatch.setattr(bi_query, "DATA_DIR", data_dir)
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path / "compiled")
+    monkeypatch.setitem(bi_query.REPORT_POLICIES, "customer-churn", CachePolicy(ttl=0, max_stale=0))
+    bi_query.REPORT_CACHE.clear()
+
+    expected = client.get("/bi/query", params={"report_id": "customer-churn"}).content
+    compile_reports.compile_report("customer-churn", tmp_path / "compiled")
+
+    compiled = client.get("/bi/query", params={"report_id": "customer-churn"})
+    assert compiled.content == expected
+    assert "mmap;dur=" in compiled.headers["server-timing"]
+    assert "parse;dur=" not in compiled.headers["server-timing"]
+
+    csv_path = data_dir / "customer_churn.csv"
+    csv_path.write_text(csv_path.read_text() + "2024-11,500,10,2.0,98.0,50000,20.0\n")
+    stale = client.get("/bi/query", params={"report_id": "customer-churn"})
+    assert "parse;dur=" in stale.headers["server-timing"]
+    assert stale.json()["data"]["count"] == 11
+
+    compile_reports.compile_report("customer-churn", tmp_path / "compiled")
+    for corrupt in (b"NOTARPT!" + b"\0" * 64, b"BIRPT001\xff"):
+        bi_query.compiled_report_path("customer-churn").write_bytes(corrupt)
+        fallback = client.get("/bi/query", params={"report_id": "customer-churn"})
+        assert fallback.status_code == 200 and fallback.json()["data"]["count"] == 11
+
+
+def _wait_for_refresh(report_id: str, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while bi_query.REPORT_CACHE.status()[report_id]["refreshing"]:
+        assert time.monotonic() < deadline, "background refresh did not finish"
+        time.sleep(0.01)
+
+
+def test_stale_reports_are_served_while_refreshing(monkeypatch, tmp_path) -> None:
+    data_dir = tmp_path / "data"
+    shutil.copytree(bi_query.DATA_DIR, data_dir, ignore=shutil.ignore_patterns("compiled"))
+    monkeypatch.setattr(bi_query, "DATA_DIR", data_dir)
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path / "compiled")
+    monkeypatch.setitem(bi_query.REPORT_POLICIES, "kpi-summary", CachePolicy(ttl=0, max_stale=3600))
+    bi_query.REPORT_CACHE.clear()
+
+    first = client.get("/bi/query", params={"report_id": "kpi-summary"}).json()
+    csv_path = data_dir / "kpi_summary.csv"
+    csv_path.write_text(csv_path.read_text() + csv_path.read_text().splitlines()[-1] + "\n")
+    lookups = {
+        result: telemetry.REPORT_CACHE_LOOKUPS.value("kpi-summary", result)
+        for result in ("hit", "stale", "miss")
+    }
+
+    stale = client.get("/bi/query", params={"report_id": "kpi-summary"})
+    assert stale.json()["data"] == first["data"]
+    assert "parse;dur=" not in stale.headers["server-timing"]
+    _wait_for_refresh("kpi-summary")
+    # The background refresh is part of the stale lookup, not a lookup of its own.
+    assert {
+        result: telemetry.REPORT_CACHE_LOOKUPS.value("kpi-summary", result) - before
+        for result, before in lookups.items()
+    } == {"hit": 0, "stale": 1, "miss": 0}
+    refreshed = client.get("/bi/query", params={"report_id": "kpi-summary"}).json()
+    assert refreshed["data"]["count"] == first["data"]["count"] + 1
+
+    csv_path.unlink()
+    assert client.get("/bi/query", params={"report_id": "kpi-summary"}).json() == refreshed
+    _wait_for_refresh("kpi-summary")
+    health = client.get("/health").json()
+    assert health["status"] == "degraded"
+    assert health["reports"]["kpi-summary"]["last_error"]
+    assert client.get("/bi/query", params={"report_id": "kpi-summary"}).json() == refreshed
+    bi_query.REPORT_CACHE.clear()
+
+
+def test_ready_after_warmup_preloads_reports(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path)
+    monkeypatch.setattr(health, "WARMUP", WarmupTracker())
+    bi_query.REPORT_CACHE.clear()
+    assert client.get("/ready").status_code == 503
+
+    with TestClient(app) as warm_client:
+        deadline = time.monotonic() + 5
+        while (response := warm_client.get("/ready")).status_code != 200:
+            assert time.monotonic() < deadline, "warm-up did not finish"
+            time.sleep(0.01)
+
+    body = response.json()
+    assert body["status"] == "ready"
+    tasks = body["warmup"]["tasks"]
+    assert set(tasks) == {"metadata", *(f"report:{r}" for r in bi_query.CSV_FILE_MAP)}
+    assert tasks["report:field-ops"]["status"] == "ok"
+    assert tasks["report:field-ops"]["rows"] > 0 and tasks["report:field-ops"]["bytes"] > 0
+    assert tasks["metadata"]["dashboards"] == len(bi_metadata.DASHBOARDS_METADATA)
+    assert set(bi_query.REPORT_CACHE.status()) == set(bi_query.CSV_FILE_MAP)
+
+
+def test_lttb_downsampling_keeps_shape_and_bounds_rows() -> None:
+    start = datetime(2020, 1, 1)
+    rows = [
+        {
+            "date": (start + timedelta(days=day)).date().isoformat(),
+            "routes_completed": 500 if day == 1234 else 100 + day % 7,
+            "avg_quality": 4.0 + (day % 10) / 10,
+        }
+        for day in range(5000)
+    ]
+    report = ColumnarReport.from_rows(["date", "routes_completed", "avg_quality"], rows)
+
+    reduced = downsample(report, 200)
+    dates = list(reduced.column("date"))
+    assert reduced.num_rows <= 200
+    assert dates[0] == rows[0]["date"] and dates[-1] == rows[-1]["date"]
+    assert dates == sorted(dates)
+    assert 500 in list(reduced.column("routes_completed"))
+    assert downsample(report, 10_000) is report
+
+    # Many series share one selection, which uses the whole budget.
+    wide_columns = ["date"] + [f"series_{n}" for n in range(10)]
+    wide = ColumnarReport.from_rows(
+        wide_columns,
+        [{"date": row["date"], **{f"series_{n}": day % (n + 2) for n in range(10)}} for day, row in enumerate(rows)],
+    )
+    assert downsample(wide, 12).num_rows == 12
+    assert downsample(report, 5).num_rows == 5
+
+    # A larger budget never returns fewer rows.
+    counts = [downsample(wide, max_points).num_rows for max_points in range(3, 400, 37)]
+    assert counts == list(range(3, 400, 37))
+
+
+def test_query_max_points_is_cached_per_report_version(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path)
+    bi_query.REPORT_CACHE.clear()
+
+    full = client.get("/bi/query", params={"report_id": "field-ops"}).json()["data"]
+    response = client.get("/bi/query", params={"report_id": "field-ops", "max_points": 6})
+    data = response.json()["data"]
+    assert data["count"] == len(data["rows"]) <= 6
+    assert data["rows"][0] == full["rows"][0] and data["rows"][-1] == full["rows"][-1]
+    assert "downsample;dur=" in response.headers["server-timing"]
+
+    entry = bi_query.REPORT_CACHE.entry("field-ops")
+    cached = entry.derived[("max_points", 6, None)]
+    client.get("/bi/query", params={"report_id": "field-ops", "max_points": 6})
+    assert bi_query.REPORT_CACHE.entry("field-ops").derived[("max_points", 6, None)] is cached
+
+    assert client.get("/bi/query", params={"report_id": "field-ops", "max_points": 2}).status_code == 422
+
+
+def test_query_enforces_group_access_policies(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path)
+    monkeypatch.setattr(
+        bi_query,
+        "ACCESS_POLICIES",
+        load_access_policies(
+            json.dumps(
+                {
+                    "kpi-summary": {
+                        "C_SUITE": {},
+                        "OPS": {
+                            "columns": ["metric", "current_value", "target_value"],
+                            "rows": {"metric": ["Routes Completed", "Avg Quality Score"]},
+                        },
+                    }
+                }
+            )
+        ),
+    )
+    bi_query.REPORT_CACHE.clear()
+    url = "/bi/query?report_id=kpi-summary"
+
+    assert client.get(url).status_code == 403
+    assert client.get(url, headers={"X-User-Groups": "FINANCE"}).status_code == 403
+
+    full = client.get(url, headers={"X-User-Groups": "OPS, C_SUITE"})
+    assert full.json()["data"]["count"] == 8
+    assert full.headers["cache-control"].startswith("private")
+
+    ops = client.get(url, headers={"X-User-Groups": "OPS"})
+    data = ops.json()["data"]
+    assert data["columns"] == ["metric", "current_value", "target_value"]
+    assert [row["metric"] for row in data["rows"]] == ["Routes Completed", "Avg Quality Score"]
+
+    view = bi_query.REPORT_CACHE.entry("kpi-summary").derived[("access", "OPS")]
+    client.get(url, headers={"X-User-Groups": "OPS"})
+    assert bi_query.REPORT_CACHE.entry("kpi-summary").derived[("access", "OPS")] is view
+    base = bi_query.REPORT_CACHE.entry("kpi-summary").data
+    assert view.data["metric"].column is base.data["metric"]
+    assert client.get("/bi/query?report_id=field-ops").headers["cache-control"].startswith("public")
+
+
+def test_signed_requests_return_a_profile(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(bi_query, "COMPILED_DIR", tmp_path)
+    profiled = TestClient(ProfilingMiddleware(app, secret="s3cret"))
+    url = "/bi/query?report_id=field-ops"
+
+    plain = profiled.get(url)
+    assert plain.json()["report_id"] == "field-ops"
+
+    signature = sign_profile_request("s3cret", url)
+    response = profiled.get(url, headers={"X-Profile-Signature": signature, "X-Profile-Format": "text"})
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "query_data" in response.text
+
+    other = profiled.get("/bi/query?report_id=kpi-summary", headers={"X-Profile-Signature": signature})
+    assert other.json()["report_id"] == "kpi-summary"
+    forged = signature.split(".")[0] + ".deadbeef"
+    assert profiled.get(url, headers={"X-Profile-Signature": forged}).json()["report_id"] == "field-ops"
+
+    with profiling._PROFILE_ACTIVE:
+        assert profiled.get(url, headers={"X-Profile-Signature": signature}).status_code == 409
+
+
+def test_sampled_profiles_are_stored_with_bounded_retention(tmp_path) -> None:
+    profiles = tmp_path / "profiles"
+    sampled = TestClient(ProfilingMiddleware(app, sample_rate=1.0, directory=str(profiles), max_files=3))
+
+    for _ in range(5):
+        assert sampled.get("/health").status_code == 200
+
+    stored = sorted(profiles.iterdir())
+    assert len(stored) == 3
+    assert all("get-health" in path.name for path in stored)
+
+    with profiling._PROFILE_ACTIVE:
+        assert sampled.get("/health").status_code == 200
+    assert sorted(profiles.iterdir()) == stored
+
+
+def test_tail_loader_parses_only_appended_rows(tmp_path) -> None:
+    csv_path = tmp_path / "field_ops.csv"
+    shutil.copy(bi_query.DATA_DIR / "field_ops.csv", csv_path)
+    loader = TailLoader()
+
+    report, mode = loader.load(csv_path)
+    assert mode == "full"
+    report.data_json  # serialized once; appends extend it
+
+    with open(csv_path, "a") as handle:
+        handle.write("2024-10-31,150,4.4,1200,29,93,90\n2024-11-01,151,4.5,")
+    appended, mode = loader.load(csv_path)
+    assert mode == "append"
+    assert appended.num_rows == report.num_rows + 1
+    assert list(appended.column("routes_completed"))[-1] == 150
+
+    assert loader.load(csv_path) == (appended, "unchanged")
+    with open(csv_path, "a") as handle:
+        handle.write("1205,30,94,91\n")
+    completed, mode = loader.load(csv_path)
+    assert mode == "append" and completed.num_rows == report.num_rows + 2
+    full, _ = TailLoader().load(csv_path)
+    assert completed.data_json == full.data_json
+    assert completed.encode() == full.encode()
+
+    csv_path.write_text(csv_path.read_text().replace("2024-10-21", "2024-10-20"))
+    assert loader.load(csv_path)[1] == "full"
+    lines = csv_path.read_text().splitlines(keepends=True)
+    csv_path.write_text("".join(lines[:-1]) + lines[-1].replace("151", "999"))
+    assert loader.load(csv_path)[1] == "full"
+
+
+def test_tail_loader_locks_per_file_and_can_skip_tracking(tmp_path) -> None:
+    csv_path = tmp_path / "field_ops.csv"
+    shutil.copy(bi_query.DATA_DIR / "field_ops.csv", csv_path)
+    other = tmp_path / "exec_revenue.csv"
+    shutil.copy(bi_query.DATA_DIR / "exec_revenue.csv", other)
+    loader = TailLoader()
+
+    # A load in progress on one file does not block loads of another.
+    with loader._path_lock(str(csv_path)):
+        assert loader.load(other)[1] == "full"
+
+    report, mode = loader.load(csv_path, track=False)
+    assert mode == "full" and str(csv_path) not in loader._states
+    loader.load(csv_path)
+    with open(csv_path, "a") as handle:
+        handle.write("2024-10-31,150,4.4,1200,29,93,90\n")
+    untracked, mode = loader.load(csv_path, track=False)
+    assert mode == "full" and untracked.num_rows == report.num_rows + 1
+    assert str(csv_path) not in loader._states
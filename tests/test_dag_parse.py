@@ -0,0 +1,69 @@
+"""Parse-cost checks for the AEP ingest DAG."""
+
+import ast
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+AIRFLOW_DIR = Path(__file__).resolve().parent.parent / "airflow"
+DAG_FILE = AIRFLOW_DIR / "dags" / "aep_ingest_clean_dag.py"
+
+# Seconds allowed for a DagBag to load the DAG file; override on slow runners.
+DAG_PARSE_BUDGET_S = float(os.getenv("DAG_PARSE_BUDGET_S", "2.0"))
+
+# Modules that must only be imported inside task execution, never at parse time.
+HEAVY_MODULES = (
+    "airflow.providers",
+    "airflow_aep_hook",
+    "adobe_aep_sdk",
+    "boto3",
+    "checkpoints",
+    "dedup",
+    "main",
+)
+
+
+def _module_level_imports(path: Path) -> set:
+    tree = ast.parse(path.read_text())
+    imported = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imported.add(node.module)
+    return imported
+
+
+@pytest.mark.parametrize(
+    "path",
+    [DAG_FILE, AIRFLOW_DIR / "airflow_aep_operators.py"],
+    ids=lambda path: path.name,
+)
+def test_parse_path_avoids_heavy_imports(path: Path) -> None:
+    heavy = {
+        name
+        for name in _module_level_imports(path)
+        if any(name == module or name.startswith(f"{module}.") for module in HEAVY_MODULES)
+    }
+
+    assert heavy == set()
+
+
+def test_dagbag_parse_time_within_budget() -> None:
+    pytest.importorskip("airflow.models.dagbag")
+    from airflow.models import DagBag
+
+    sys.path.insert(0, str(AIRFLOW_DIR))
+    try:
+        started = time.perf_counter()
+        dagbag = DagBag(dag_folder=str(DAG_FILE), include_examples=False)
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.path.remove(str(AIRFLOW_DIR))
+
+    assert dagbag.import_errors == {}
+    assert "aep_clean_ingest" in dagbag.dags
+    assert elapsed < DAG_PARSE_BUDGET_S, f"DagBag load took {elapsed:.3f}s"
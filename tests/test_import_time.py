@@ -0,0 +1,45 @@
+"""Import-time regression checks for the pipeline entry point."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cumulative ``import main`` time in microseconds; override on slow CI runners.
+IMPORT_BUDGET_US = int(os.getenv("MAIN_IMPORT_BUDGET_US", "150000"))
+DEFERRED_MODULES = ("boto3", "botocore", "pydantic", "adapters", "models", "adobe_aep_sdk")
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_import_main_defers_heavy_dependencies() -> None:
+    probe = (
+        "import sys, main; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    loaded = _run("-c", probe).stdout.strip()
+
+    assert loaded == ""
+
+
+def test_import_main_within_budget() -> None:
+    result = _run("-X", "importtime", "-c", "import main")
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "main":
+            cumulative_us = int(parts[1])
+
+    assert cumulative_us is not None, result.stderr
+    assert cumulative_us < IMPORT_BUDGET_US, f"import main took {cumulative_us}us"
@@ -0,0 +1,153 @@
+"""Tests for time-partitioned Query Service execution, against SQLite."""
+
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "airflow"))
+
+from partitioned_query import run_partitioned, slice_sql, time_slices  # noqa: E402
+
+START = datetime(2025, 1, 1)
+END = datetime(2025, 1, 11)
+SQL = "SELECT customer_id, event_type, event_timestamp FROM events"
+
+
+@pytest.fixture()
+def events_db(tmp_path) -> Path:
+    path = tmp_path / "events.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE events (customer_id TEXT, event_type TEXT, event_timestamp TEXT)")
+        conn.executemany(
+            "INSERT INTO events VALUES (?, ?, ?)",
+            [
+                (str(index), "purchase", (START + timedelta(minutes=17 * index)).strftime("%Y-%m-%d %H:%M:%S"))
+                for index in range(1000)
+            ],
+        )
+    return path
+
+
+def _executor(path: Path):
+    def execute(sql: str):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql)]
+        finally:
+            conn.close()
+
+    return execute
+
+
+def test_time_slices_cover_the_range_without_gaps() -> None:
+    slices = time_slices(START, END, 7)
+    assert len(slices) == 7
+    assert slices[0].start == START and slices[-1].end == END
+    assert all(a.end == b.start for a, b in zip(slices, slices[1:]))
+    assert all(s.start.microsecond == 0 for s in slices)
+
+    templated = slice_sql("SELECT * FROM events WHERE ts >= {slice_start} AND ts < {slice_end}", "ts", slices[0])
+    assert "ts >= '2025-01-01 00:00:00'" in templated
+
+
+def test_partitioned_query_matches_single_query_with_retries(events_db) -> None:
+    execute = _executor(events_db)
+    lower, upper = START.strftime("%Y-%m-%d %H:%M:%S"), END.strftime("%Y-%m-%d %H:%M:%S")
+    expected = execute(
+        f"{SQL} WHERE event_timestamp >= '{lower}' AND event_timestamp < '{upper}' ORDER BY event_timestamp"
+    )
+
+    lock = threading.Lock()
+    active = peak = 0
+    failures = {"2025-01-03": 1}
+
+    def flaky(sql: str):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+            day = next((d for d in failures if f">= '{d}" in sql and failures[d]), None)
+            if day:
+                failures[day] -= 1
+        try:
+            time.sleep(0.02)
+            if day:
+                raise sqlite3.OperationalError("transient")
+            return execute(sql + " ORDER BY event_timestamp")
+        finally:
+            with lock:
+                active -= 1
+
+    rows = list(
+        run_partitioned(
+            flaky,
+            SQL,
+            column="event_timestamp",
+            start=START.isoformat(),
+            end=END.isoformat(),
+            slices=10,
+            parallelism=3,
+            retry_delay=0.01,
+        )
+    )
+
+    assert rows == expected
+    assert len(rows) == 848
+    assert peak <= 3
+    assert failures["2025-01-03"] == 0
+
+
+def test_partitioned_query_raises_after_exhausting_retries(events_db) -> None:
+    def broken(sql: str):
+        raise sqlite3.OperationalError("Query Service timeout")
+
+    with pytest.raises(RuntimeError, match="failed after 2 attempts"):
+        list(
+            run_partitioned(
+                broken, SQL, column="event_timestamp", start=START, end=END, retries=1, retry_delay=0
+            )
+        )
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM events LIMIT 100",
+        "SELECT event_type, event_timestamp FROM events GROUP BY event_type, event_timestamp",
+        "SELECT DISTINCT event_type, event_timestamp FROM events",
+        "SELECT * FROM events ORDER BY customer_id",
+        "SELECT max(event_timestamp) AS event_timestamp FROM events",
+    ],
+)
+def test_slice_sql_rejects_statements_that_wrapping_would_change(sql) -> None:
+    with pytest.raises(ValueError, match="slice_start"):
+        slice_sql(sql, "event_timestamp", time_slices(START, END, 2)[0])
+
+
+def test_placeholders_allow_aggregates_per_slice(events_db) -> None:
+    execute = _executor(events_db)
+    sql = (
+        "SELECT event_type, count(*) AS n FROM events "
+        "WHERE event_timestamp >= {slice_start} AND event_timestamp < {slice_end} "
+        "GROUP BY event_type"
+    )
+
+    rows = list(
+        run_partitioned(
+            execute, sql, column="event_timestamp", start=START, end=END, slices=4, retry_delay=0
+        )
+    )
+
+    # One partial count per slice; the caller combines them.
+    assert len(rows) == 4
+    in_range = execute(
+        "SELECT count(*) AS n FROM events "
+        "WHERE event_timestamp >= '2025-01-01 00:00:00' AND event_timestamp < '2025-01-11 00:00:00'"
+    )
+    assert sum(row["n"] for row in rows) == in_range[0]["n"]
@@ -1,13 +1,23 @@
 """Unit tests for the pipeline runner."""
 
+import asyncio
+import io
+import json
 import sys
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from main import run_pipeline
+import main
+from main import PipelineContext, iter_json_records, run_pipeline, run_pipeline_async
+from checkpoints import Checkpoint, InMemoryCheckpointStore, S3CheckpointStore, filter_past_watermark
+from dedup import RecordDeduplicator
+from record_buffer import RecordBuffer
 
 
 def _fake_s3_get_object(*args: Any, **kwargs: Any) -> Dict[str, Any]:
@@ -15,7 +25,7 @@ def _fake_s3_get_object(*args: Any, **kwargs: Any) -> Dict[str, Any]:
         b'[{"customer_id": "123", "event_type": "purchase", '
         b'"event_timestamp": "2025-01-01T00:00:00Z"}]'
     )
-    return {"Body": MagicMock(read=lambda: body)}
+    return {"Body": io.BytesIO(body)}
 
 
 def _fake_s3_put_object(*args: Any, **kwargs: Any) -> Dict[str, Any]:
@@ -33,9 +43,14 @@ def test_run_pipeline_happy_path(
     mock_aep_client_cls,
     mock_get_object,
     mock_put_object,
+    tmp_path,
+    monkeypatch,
 ) -> None:
     mock_ingest = MagicMock()
     mock_query = MagicMock()
+    store = InMemoryCheckpointStore()
+    store.close = MagicMock()  # type: ignore[method-assign]
+    monkeypatch.setattr("main.default_checkpoint_store", lambda: store)
 
     mock_ingest.create_batch.return_value = {"id": "batch-123"}
     mock_query.execute.return_value = {"results": [{"foo": "bar"}]}
@@ -49,9 +64,12 @@ def test_run_pipeline_happy_path(
         target_bucket="test-bucket",
         target_key="output/data.json",
         dataset_id="test_dataset",
+        deduplicator=RecordDeduplicator(tmp_path, capacity=1000),
     )
 
     assert result["batch_id"] == "batch-123"
+    assert store.get("s3://test-bucket/input/data.json") is not None
+    store.close.assert_called_once_with()
     assert result["validated_in"] == 1
     assert result["returned_from_aep"] == 1
     assert result["output_key"] == "output/data.json"
@@ -61,3 +79,460 @@ def test_run_pipeline_happy_path(
     mock_ingest.commit_batch.assert_called_once()
     mock_query.execute.assert_called_once()
     mock_put_object.assert_called_once()
+
+
+def _s3_object(body: bytes, etag: str) -> Dict[str, Any]:
+    return {
+        "Body": io.BytesIO(body),
+        "ETag": etag,
+        "ContentLength": len(body),
+    }
+
+
+@patch("main.s3.put_object", side_effect=_fake_s3_put_object)
+@patch("main.s3.get_object")
+@patch("main.AEPClient")
+@patch("main.IngestionClient")
+@patch("main.QueryServiceClient")
+def test_run_pipeline_incremental_checkpoints(
+    mock_query_cls,
+    mock_ingest_cls,
+    mock_aep_client_cls,
+    mock_get_object,
+    mock_put_object,
+    tmp_path,
+) -> None:
+    mock_ingest = MagicMock()
+    mock_ingest.create_batch.return_value = {"id": "batch-123"}
+    mock_ingest_cls.return_value = mock_ingest
+    mock_query_cls.return_value.execute.return_value = {"results": []}
+
+    store = InMemoryCheckpointStore()
+    kwargs = dict(
+        source_bucket="test-bucket",
+        source_key="input/data.json",
+        target_bucket="test-bucket",
+        target_key="output/data.json",
+        dataset_id="test_dataset",
+        checkpoint_store=store,
+        deduplicator=RecordDeduplicator(tmp_path, capacity=1000),
+    )
+    first_body = (
+        b'[{"customer_id": "1", "event_type": "purchase", "order_id": "o-1", '
+        b'"event_timestamp": "2025-01-01T00:00:00Z"},'
+        b' {"customer_id": "2", "event_type": "purchase", "order_id": "o-2", '
+        b'"event_timestamp": "2025-01-02T00:00:00Z"}]'
+    )
+    mock_get_object.return_value = _s3_object(first_body, '"etag-1"')
+
+    first = run_pipeline(**kwargs)
+    assert first["validated_in"] == 2
+    checkpoint = store.get("s3://test-bucket/input/data.json")
+    assert checkpoint == Checkpoint(
+        source="s3://test-bucket/input/data.json",
+        etag='"etag-1"',
+        size=len(first_body),
+        watermark="2025-01-02T00:00:00Z",
+        updated_at=checkpoint.updated_at,
+    )
+
+    # Same ETag: skipped without reading or ingesting anything.
+    second = run_pipeline(**kwargs)
+    assert second["skipped_unchanged"] is True
+    assert mock_get_object.call_args.kwargs["IfNoneMatch"] == '"etag-1"'
+    assert mock_ingest.create_batch.call_count == 1
+
+    # Appended object: records from the watermark on are read again (the tie at
+    # the watermark is dropped by dedup), so only the new record is ingested.
+    appended_body = first_body[:-1] + (
+        b', {"customer_id": "3", "event_type": "purchase", "order_id": "o-3", '
+        b'"event_timestamp": "2025-01-03T00:00:00Z"}]'
+    )
+    mock_get_object.return_value = _s3_object(appended_body, '"etag-2"')
+
+    third = run_pipeline(**kwargs)
+    assert third["records_in"] == 3
+    assert third["records_past_watermark"] == 2
+    assert third["dedup"]["duplicates"] == 1 and third["dedup"]["unique"] == 1
+    assert store.get("s3://test-bucket/input/data.json").watermark == "2025-01-03T00:00:00Z"
+
+
+def test_dedup_stages_run_keys_on_disk_until_commit(tmp_path) -> None:
+    deduplicator = RecordDeduplicator(tmp_path, capacity=1000)
+    first = [{"_id": "a"}, {"_id": "b"}, {"_id": "a"}]
+
+    unique, stats = deduplicator.filter(first)
+    assert unique == first[:2] and stats.duplicates == 1
+    unique, stats = deduplicator.filter([{"_id": "b"}, {"_id": "c"}])
+    assert unique == [{"_id": "c"}] and stats.duplicates == 1
+
+    deduplicator.discard_pending()
+    assert deduplicator.filter(first)[0] == first[:2]
+    deduplicator.commit_pending()
+    unique, stats = deduplicator.filter(first)
+    assert unique == [] and stats.bloom_positives == 3
+    deduplicator.close()
+
+
+class _FakeS3Objects:
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self) -> None:
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Bucket, Key])}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs: Any) -> None:
+        self.objects[Bucket, Key] = Body
+
+
+def test_s3_checkpoint_store_round_trips_checkpoints() -> None:
+    client = _FakeS3Objects()
+    store = S3CheckpointStore(client, "state-bucket", "aep-checkpoints/")
+    source = "s3://test-bucket/input/data.json"
+    assert store.get(source) is None
+
+    checkpoint = Checkpoint(source=source, etag='"etag-1"', size=10, watermark="2025-01-02T00:00:00Z")
+    store.put(checkpoint)
+    key = "aep-checkpoints/test-bucket/input/data.json.checkpoint.json"
+    assert list(client.objects) == [("state-bucket", key)]
+    assert S3CheckpointStore(client, "state-bucket").get(source) == checkpoint
+
+
+def test_watermark_keeps_ties_and_late_records_within_lookback() -> None:
+    records = [
+        {"event_timestamp": "2025-01-01T23:00:00Z"},
+        {"event_timestamp": "2025-01-01T23:59:00Z"},
+        {"event_timestamp": "2025-01-02T00:00:00Z"},
+        {"event_timestamp": "2025-01-02T01:00:00Z"},
+    ]
+
+    kept, watermark = filter_past_watermark(records, "2025-01-02T00:00:00Z")
+    assert kept == records[2:] and watermark == "2025-01-02T01:00:00Z"
+    kept, _ = filter_past_watermark(records, "2025-01-02T00:00:00Z", lookback=600)
+    assert kept == records[1:]
+    kept, _ = filter_past_watermark(records, "2025-01-02T00:00:00Z", keep_ties=False)
+    assert kept == records[3:]
+
+
+@patch("main.s3.put_object", side_effect=_fake_s3_put_object)
+@patch("main.s3.get_object")
+@patch("main.AEPClient")
+@patch("main.IngestionClient")
+@patch("main.QueryServiceClient")
+def test_run_pipeline_drops_redelivered_events(
+    mock_query_cls,
+    mock_ingest_cls,
+    mock_aep_client_cls,
+    mock_get_object,
+    mock_put_object,
+    tmp_path,
+) -> None:
+    mock_ingest = MagicMock()
+    mock_ingest.create_batch.return_value = {"id": "batch-123"}
+    mock_ingest_cls.return_value = mock_ingest
+    mock_query_cls.return_value.execute.return_value = {"results": []}
+
+    deduplicator = RecordDeduplicator(tmp_path, capacity=1000)
+    kwargs = dict(
+        source_bucket="test-bucket",
+        source_key="input/data.json",
+        target_bucket="test-bucket",
+        target_key="output/data.json",
+        dataset_id="test_dataset",
+        incremental=False,
+        deduplicator=deduplicator,
+    )
+    body = (
+        b'[{"customer_id": "1", "event_type": "purchase", "order_id": "o-1", '
+        b'"event_timestamp": "2025-01-01T00:00:00Z"},'
+        b' {"customer_id": "1", "event_type": "purchase", "order_id": "o-1", '
+        b'"event_timestamp": "2025-01-01T00:00:00Z"},'
+        b' {"customer_id": "2", "event_type": "purchase", "order_id": "o-2", '
+        b'"event_timestamp": "2025-01-02T00:00:00Z"}]'
+    )
+    mock_get_object.side_effect = lambda **_: {"Body": io.BytesIO(body)}
+
+    first = run_pipeline(**kwargs)
+    assert first["dedup"]["unique"] == 2
+    assert first["dedup"]["duplicates"] == 1
+    uploaded = mock_ingest.upload_batch_data.call_args.kwargs["data_bytes"]
+    assert uploaded.count(b"\n") == 1
+
+    second = run_pipeline(**kwargs)
+    assert second["batch_id"] is None
+    assert second["dedup"]["duplicates"] == 3
+    assert second["dedup"]["bloom_positives"] == 3
+    assert mock_ingest.create_batch.call_count == 1
+
+    other_dataset = run_pipeline(**{**kwargs, "dataset_id": "other_dataset"})
+    assert other_dataset["dedup"]["unique"] == 2
+
+
+LATENCY = 0.05
+
+
+def _event_body(count: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "customer_id": str(index),
+                "event_type": "purchase",
+                "order_id": f"o-{index}",
+                "event_timestamp": f"2025-01-01T00:00:{index % 60:02d}Z",
+            }
+            for index in range(count)
+        ]
+    ).encode("utf-8")
+
+
+class _SlowS3:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.put: Optional[Dict[str, Any]] = None
+
+    def get_object(self, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(LATENCY)
+        return {"Body": io.BytesIO(self.body), "ETag": '"etag-1"', "ContentLength": len(self.body)}
+
+    def put_object(self, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(LATENCY)
+        self.put = kwargs
+        return {}
+
+
+class _SlowIngestion:
+    def __init__(self, fail_on_upload: Optional[int] = None) -> None:
+        self.fail_on_upload = fail_on_upload
+        self.uploads: List[Tuple[float, float, bytes]] = []
+        self.file_names: List[str] = []
+        self.committed: List[str] = []
+
+    def create_batch(self, dataset_id: str) -> Dict[str, str]:
+        time.sleep(LATENCY)
+        return {"id": "batch-async"}
+
+    def upload_batch_data(self, batch_id: str, data_bytes: bytes, file_name: str) -> None:
+        if self.fail_on_upload == len(self.uploads):
+            raise RuntimeError("upload failed")
+        self.file_names.append(file_name)
+        started = time.perf_counter()
+        time.sleep(2 * LATENCY)
+        self.uploads.append((started, time.perf_counter(), data_bytes))
+
+    def commit_batch(self, batch_id: str) -> None:
+        self.committed.append(batch_id)
+
+
+def _async_context(body: bytes, ingestion: _SlowIngestion) -> Tuple[PipelineContext, _SlowS3]:
+    s3 = _SlowS3(body)
+    query = MagicMock()
+    query.execute.side_effect = lambda sql: {"results": [{"sql": sql}]}
+    return PipelineContext(s3=s3, clients={"ingestion_client": ingestion, "query_client": query}), s3
+
+
+def _timed_validation(monkeypatch) -> List[Tuple[float, float]]:
+    windows: List[Tuple[float, float]] = []
+    validate = main.validate_records
+
+    def slow_validate(records):
+        started = time.perf_counter()
+        time.sleep(2 * LATENCY)
+        result = validate(records)
+        windows.append((started, time.perf_counter()))
+        return result
+
+    monkeypatch.setattr(main, "validate_records", slow_validate)
+    return windows
+
+
+def test_async_pipeline_overlaps_upload_with_validation(monkeypatch, tmp_path) -> None:
+    body = _event_body(40)
+    validation_windows = _timed_validation(monkeypatch)
+    kwargs = dict(
+        source_bucket="test-bucket",
+        source_key="input/data.json",
+        target_bucket="test-bucket",
+        target_key="output/data.json",
+        dataset_id="test_dataset",
+    )
+
+    ingestion = _SlowIngestion()
+    context, s3 = _async_context(body, ingestion)
+    started = time.perf_counter()
+    result = asyncio.run(
+        run_pipeline_async(
+            **kwargs,
+            checkpoint_store=InMemoryCheckpointStore(),
+            deduplicator=RecordDeduplicator(tmp_path / "async", capacity=1000),
+            context=context,
+            chunk_size=10,
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    sync_context, _ = _async_context(body, _SlowIngestion())
+    expected = run_pipeline(
+        **kwargs,
+        checkpoint_store=InMemoryCheckpointStore(),
+        deduplicator=RecordDeduplicator(tmp_path / "sync", capacity=1000),
+        context=sync_context,
+    )
+
+    # The async runner holds bounded chunks instead of a spill buffer.
+    assert expected.pop("buffer")["records"] == 40
+    assert result == {**expected, "batch_id": "batch-async"}
+    assert result["validated_in"] == 40 and result["dedup"]["unique"] == 40
+    assert len(ingestion.uploads) == 4
+    assert ingestion.file_names == [f"part-{part:05d}.json" for part in range(4)]
+    assert sum(data.count(b"\n") + 1 for _, _, data in ingestion.uploads) == 40
+    assert ingestion.committed == ["batch-async"]
+    assert json.loads(s3.put["Body"]) == [{"sql": "SELECT * FROM test_dataset LIMIT 100"}]
+
+    # Upload of chunk N overlaps validation of chunk N+1.
+    _, first_upload_end, _ = ingestion.uploads[0]
+    second_validation_start, _ = validation_windows[1]
+    assert second_validation_start < first_upload_end
+    # get + 4 validations + create_batch + 4 uploads + put, back to back
+    sequential = LATENCY + 4 * 2 * LATENCY + LATENCY + 4 * 2 * LATENCY + LATENCY
+    assert elapsed < sequential
+
+
+def test_async_pipeline_propagates_errors_without_committing(monkeypatch, tmp_path) -> None:
+    _timed_validation(monkeypatch)
+    store = InMemoryCheckpointStore()
+    deduplicator = RecordDeduplicator(tmp_path, capacity=1000)
+    ingestion = _SlowIngestion(fail_on_upload=1)
+    context, s3 = _async_context(_event_body(30), ingestion)
+
+    with pytest.raises(RuntimeError, match="upload failed"):
+        asyncio.run(
+            run_pipeline_async(
+                source_bucket="test-bucket",
+                source_key="input/data.json",
+                target_bucket="test-bucket",
+                target_key="output/data.json",
+                dataset_id="test_dataset",
+                checkpoint_store=store,
+                deduplicator=deduplicator,
+                context=context,
+                chunk_size=10,
+            )
+        )
+
+    assert ingestion.committed == []
+    assert s3.put is None
+    assert store.get("s3://test-bucket/input/data.json") is None
+    assert deduplicator.filter(
+        [json.loads(ingestion.uploads[0][2].splitlines()[0])], namespace="test_dataset"
+    )[1].duplicates == 0
+
+
+def test_async_pipeline_can_be_cancelled(monkeypatch, tmp_path) -> None:
+    _timed_validation(monkeypatch)
+    ingestion = _SlowIngestion()
+    context, s3 = _async_context(_event_body(50), ingestion)
+
+    async def cancel_midway() -> None:
+        task = asyncio.ensure_future(
+            run_pipeline_async(
+                source_bucket="test-bucket",
+                source_key="input/data.json",
+                target_bucket="test-bucket",
+                target_key="output/data.json",
+                dataset_id="test_dataset",
+                checkpoint_store=InMemoryCheckpointStore(),
+                deduplicator=RecordDeduplicator(tmp_path, capacity=1000),
+                context=context,
+                chunk_size=10,
+            )
+        )
+        await asyncio.sleep(6 * LATENCY)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_midway())
+    assert ingestion.committed == []
+    assert s3.put is None
+
+
+def test_json_records_are_parsed_incrementally() -> None:
+    records = [{"id": index, "name": "é" * index, "score": index * 1.5} for index in range(50)]
+    array_body = json.dumps(records).encode("utf-8")
+    ndjson_body = b"\n".join(json.dumps(record).encode("utf-8") for record in records)
+
+    assert list(iter_json_records(io.BytesIO(array_body), chunk_size=7)) == records
+    assert list(iter_json_records(ndjson_body, chunk_size=7)) == records
+    assert list(iter_json_records(b" [ 12345 , 6 ] ", chunk_size=2)) == [12345, 6]
+    assert list(iter_json_records(b"[]")) == list(iter_json_records(b"")) == []
+    with pytest.raises(ValueError):
+        list(iter_json_records(b'[{"id": 1}, {"id"', chunk_size=4))
+
+
+def test_record_buffer_spills_past_memory_budget(tmp_path) -> None:
+    records = [{"_id": str(index), "value": "x" * 50} for index in range(1000)]
+    with RecordBuffer(4096, directory=str(tmp_path)) as buffer:
+        buffer.extend(records)
+        assert buffer.stats.spilled_records > 900
+        assert buffer.stats.peak_buffer_bytes <= 4096 + 100
+
+        assert list(buffer) == records
+        chunks = list(buffer.iter_ndjson(max_bytes=20_000))
+        assert len(chunks) > 1 and all(len(chunk) <= 20_000 for chunk in chunks)
+        assert b"\n".join(chunks) == b"\n".join(json.dumps(record).encode() for record in records)
+
+        report = buffer.report()
+        assert 0 < report["spill_file_bytes"] < report["spilled_bytes"]
+        assert report["peak_rss_bytes"] > 0
+        with pytest.raises(RuntimeError):
+            buffer.append({"_id": "late"})
+
+
+@patch("main.s3.put_object", side_effect=_fake_s3_put_object)
+@patch("main.s3.get_object")
+@patch("main.AEPClient")
+@patch("main.IngestionClient")
+@patch("main.QueryServiceClient")
+def test_run_pipeline_reports_spilled_records(
+    mock_query_cls,
+    mock_ingest_cls,
+    mock_aep_client_cls,
+    mock_get_object,
+    mock_put_object,
+    tmp_path,
+) -> None:
+    mock_ingest = MagicMock()
+    mock_ingest.create_batch.return_value = {"id": "batch-123"}
+    mock_ingest_cls.return_value = mock_ingest
+    mock_query_cls.return_value.execute.return_value = {"results": []}
+    mock_get_object.side_effect = lambda **_: {"Body": io.BytesIO(_event_body(200))}
+
+    result = run_pipeline(
+        source_bucket="test-bucket",
+        source_key="input/data.json",
+        target_bucket="test-bucket",
+        target_key="output/data.json",
+        dataset_id="test_dataset",
+        incremental=False,
+        deduplicator=RecordDeduplicator(tmp_path / "dedup", capacity=1000),
+        record_buffer=RecordBuffer(8192, directory=str(tmp_path)),
+        upload_chunk_bytes=32_768,
+    )
+
+    assert result["validated_in"] == 200
+    assert result["buffer"]["records"] == 200
+    assert result["buffer"]["spilled_records"] > 0
+    assert result["buffer"]["peak_buffer_bytes"] <= 8192 + 1024
+    calls = mock_ingest.upload_batch_data.call_args_list
+    uploads = [call.kwargs["data_bytes"] for call in calls]
+    assert len(uploads) > 1
+    assert len({call.kwargs["file_name"] for call in calls}) == len(uploads)
+    assert sum(upload.count(b"\n") + 1 for upload in uploads) == 200
+    mock_ingest.commit_batch.assert_called_once_with(batch_id="batch-123")
+    assert list(tmp_path.glob("aep-records-*")) == []